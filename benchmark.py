@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+"""Headless benchmarks for tracking simulation performance between runs.
+
+Example::
+
+    python benchmark.py --turns 200 small-few large-horde
+    python benchmark.py --json >> bench_output.txt
+    python benchmark.py --save-maps 1 4 16
+    python benchmark.py --startup
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import functools
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import attrs
+import numpy as np
+
+import game.map_tools
+import game.mapgen.caves
+import game.save
+import game.simulation
+import game.stats
+from game.map import Map, MapKey
+
+
+@attrs.define(frozen=True)
+class Scenario:
+    """A benchmark world layout."""
+
+    width: int
+    height: int
+    monsters: int
+    chunked: bool = False
+    """Store the cave as a `game.chunked_map.ChunkedMap`."""
+
+
+SCENARIOS = {
+    "small-few": Scenario(50, 50, 10),
+    "small-crowded": Scenario(50, 50, 500),
+    "medium-horde": Scenario(200, 200, 2000),
+    "large-few": Scenario(500, 500, 10),
+    "large-horde": Scenario(500, 500, 5000),
+    "large-chunked": Scenario(500, 500, 5000, chunked=True),
+}
+
+
+def run_scenario(name: str, turns: int, seed: int, *, stats: bool = False) -> dict[str, float]:
+    """Run a single scenario and return its stats.  If `stats` is True then `game.stats` is enabled."""
+    scenario = SCENARIOS[name]
+    with Path(os.devnull).open("w") as devnull, contextlib.redirect_stdout(devnull):  # Silence combat prints.
+        start_time = time.perf_counter()
+        world = game.simulation.new_cave_world(
+            scenario.width, scenario.height, scenario.monsters, seed=seed, chunked=scenario.chunked
+        )
+        if stats:
+            game.stats.enable(world)
+        setup_time = time.perf_counter() - start_time
+        result = game.simulation.simulate(world, game.simulation.random_commands(seed), turns)
+    return {"setup": setup_time, **result.as_dict()}
+
+
+def run_save_benchmark(maps: int, seed: int) -> dict[str, float]:
+    """Save and load a world with `maps` large caves and return the timings."""
+    scenario = SCENARIOS["large-few"]
+    with Path(os.devnull).open("w") as devnull, contextlib.redirect_stdout(devnull):
+        world = game.simulation.new_cave_world(scenario.width, scenario.height, scenario.monsters, seed=seed)
+        for level in range(2, maps + 1):
+            key = MapKey(game.mapgen.caves.new_cave, level, scenario.width, scenario.height, scenario.monsters)
+            game.map_tools.get_map(world, key)
+        game.simulation.simulate(world, game.simulation.random_commands(seed), 10)  # Fill the memory of the player.
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory, "world.sav")
+        start_time = time.perf_counter()
+        game.save.save_world(world, path)
+        save_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        loaded = game.save.load_world(path)
+        load_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        for map in loaded.Q.all_of(components=[Map]):  # Touch every array to read the memory-mapped pages.
+            for array in map.components[Map].dense().values():
+                np.asarray(array).sum()
+        touch_time = time.perf_counter() - start_time
+        size = path.stat().st_size
+        del loaded  # Release the memory-map before the directory is removed.
+    return {"save": save_time, "load": load_time, "touch": touch_time, "megabytes": size / 1_000_000}
+
+
+def parse_importtime(output: str) -> list[tuple[str, int, int, int]]:
+    """Parse the output of `python -X importtime` into `(module, depth, self_us, cumulative_us)` tuples.
+
+    >>> parse_importtime("import time: self [us] | cumulative | imported package\\n"
+    ...                  "import time:       150 |        150 |   tcod.constants\\n"
+    ...                  "import time:       300 |        450 | tcod")
+    [('tcod.constants', 1, 150, 150), ('tcod', 0, 300, 450)]
+    """
+    imports: list[tuple[str, int, int, int]] = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        if not self_us.strip().isdigit():
+            continue  # Header line.
+        module = name.strip()
+        imports.append((module, (len(name) - len(name.lstrip()) - 1) // 2, int(self_us), int(cumulative_us)))
+    return imports
+
+
+def run_startup_benchmark(report: int = 10) -> dict[str, float]:
+    """Launch the game headless and return the time from launch until the first frame is presented.
+
+    The `report` slowest imports by their own time are printed to stderr.
+    """
+    launch_time = time.time()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "main.py", "--headless"],
+        cwd=Path(__file__).parent,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    presented = [line for line in process.stdout.splitlines() if line.startswith("presented ")]
+    if process.returncode != 0 or not presented:
+        msg = f"Headless startup failed:\n{process.stderr[-2000:]}"
+        raise RuntimeError(msg)
+    present_time = float(presented[0].removeprefix("presented "))
+
+    imports = parse_importtime(process.stderr)
+    for module, _, self_us, cumulative_us in sorted(imports, key=lambda item: item[2], reverse=True)[:report]:
+        print(f"{self_us / 1000:>10.1f} ms self {cumulative_us / 1000:>10.1f} ms cumulative  {module}", file=sys.stderr)
+    return {
+        "launch_to_present": present_time - launch_time,
+        "imports": sum(cumulative_us for _, depth, _, cumulative_us in imports if depth == 0) / 1_000_000,
+        "modules": len(imports),
+    }
+
+
+def main() -> None:
+    """Benchmark entry point."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", metavar="scenario", help=f"Scenarios to run: {', '.join(SCENARIOS)}")
+    parser.add_argument("--turns", type=int, default=100, help="Number of player turns to simulate.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the world and player command stream.")
+    parser.add_argument("--json", action="store_true", help="Output results as JSON lines.")
+    parser.add_argument("--stats", action="store_true", help="Run scenarios with the columnar stats store enabled.")
+    parser.add_argument(
+        "--save-maps", type=int, nargs="+", metavar="N", help="Benchmark save/load of worlds with N maps instead."
+    )
+    parser.add_argument(
+        "--startup", action="store_true", help="Benchmark headless startup and report the slowest imports instead."
+    )
+    args = parser.parse_args()
+    for name in args.scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"Unknown scenario: {name}")
+
+    if args.startup:
+        runs = {"startup": run_startup_benchmark}
+    elif args.save_maps:
+        runs = {f"save-{maps}-maps": functools.partial(run_save_benchmark, maps, args.seed) for maps in args.save_maps}
+    else:
+        runs = {
+            name: functools.partial(run_scenario, name, args.turns, args.seed, stats=args.stats)
+            for name in args.scenarios or SCENARIOS
+        }
+    for name, run in runs.items():
+        result = run()
+        if args.json:
+            print(json.dumps({"scenario": name, "time": time.time(), **result}))
+        else:
+            print(f"{name:>16}: " + ", ".join(f"{key}={value:.4g}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -8,3 +8,5 @@
 context: tcod.context.Context
 state: list[game.state.State]
 world: tcod.ecs.World
+ui_generation: int = 0
+"""Incremented whenever the UI changes in a way which needs to be redrawn."""
@@ -7,13 +7,19 @@
 
 import game.actor_tools
 import game.combat
+import game.dormancy
 import game.map_tools
+import game.pathfinding
+import game.spatial
+import game.stats
 from game.action import Action, Impossible, PlanResult, Success
 from game.components import Context, Direction, Position
 from game.map import Map, MapKey
-from game.map_attrs import a_tiles
 from game.tags import ChildOf, IsActor, IsPlayer
-from game.tiles import TileDB
+from game.travel import force_move
+
+NOISE_RADIUS = 5
+"""Dormant actors within this distance of a fight are woken by the noise."""
 
 
 class Move(Action):
@@ -26,7 +32,7 @@ def plan(self, actor: Entity) -> PlanResult:
         active_map = context.active_map.components[Map]
         if not (0 <= dest.x < active_map.width and 0 <= dest.y < active_map.height):
             return Impossible("Blocked.")
-        if world[None].components[TileDB].data["walk_cost"][active_map[a_tiles][dest.yx]] > 0:
+        if game.map_tools.get_tile_data(context.active_map, "walk_cost")[dest.yx] > 0:
             return self
         return Impossible("Blocked.")
 
@@ -49,10 +55,16 @@ def plan(self, actor: Entity) -> PlanResult:
 
     def execute(self, actor: Entity) -> Success:
         target = self.data[Entity]
-        damage = actor.components[("attack", int)]
+        game.dormancy.wake_near(target.relation_tag[ChildOf], target.components[Position], NOISE_RADIUS)
+        store = actor.world[None].components.get(game.stats.StatsStore)
+        if store is not None:  # The hp component is written when the store is committed.
+            damage, hp = store.melee(actor, target)
+        else:
+            damage = actor.components[("attack", int)]
+            hp = target.components[("hp", int)] = target.components[("hp", int)] - damage
         print(f"Attacking {target} for {damage} damage.")
-        target.components[("hp", int)] -= damage
-        if target.components[("hp", int)] < 0:
+        if hp < 0:
+            game.stats.commit(actor.world)  # Killing the player ends the game.
             game.combat.kill(target)
         return Success(time_passed=100)
 
@@ -62,8 +74,8 @@ class Bump(Action):
 
     def plan(self, actor: Entity) -> PlanResult:
         dest = actor.components[Position] + self.data[Direction]
-        for target in actor.world.Q.all_of([Position], tags=[IsActor]):
-            if target.components[Position] == dest and target is not actor:
+        for target in game.spatial.entities_at(actor.relation_tag[ChildOf], dest):
+            if IsActor in target.tags and target is not actor:
                 result = Melee([target]).plan(actor)
                 if result:
                     return result
@@ -81,10 +93,9 @@ def get_stairs(self, actor: Entity) -> PassageInfo | None:
         this_map = actor.relation_tag[ChildOf]
         direction = self.data[str]
         inverse_dir = {"up": "down", "down": "up"}[self.data[str]]
-        for stairs in world.Q.all_of(
-            tags=[actor.components[Position]],
-            relations=[(ChildOf, this_map), (direction, ...)],
-        ):
+        for stairs in game.spatial.entities_at(this_map, actor.components[Position]):
+            if direction not in stairs.relation_tag:
+                continue
             next_map_key = stairs.relation_tag[direction].uid
             assert isinstance(next_map_key, MapKey)
             for exit_passage in world.Q.all_of(
@@ -101,8 +112,7 @@ def plan(self, actor: Entity) -> PlanResult:
     def execute(self, actor: Entity) -> Success:
         passage = self.get_stairs(actor)
         assert passage
-        actor.components[Position] = passage.exit.components[Position]
-        actor.relation_tags[ChildOf] = game.map_tools.activate_map(actor.world, passage.next_map)
+        force_move(actor, passage.exit.components[Position], game.map_tools.activate_map(actor.world, passage.next_map))
         return Success(time_passed=100)
 
 
@@ -116,16 +126,17 @@ class AttackPlayer(Action):
 
     def plan(self, actor: Entity) -> PlanResult:
         """Bump towards the player actor."""
-        my_fov = game.actor_tools.compute_fov(actor)
         targets = [
             target
             for target in actor.world.Q.all_of(
-                components=[Position], tags=[IsPlayer], relations=[(ChildOf, actor.relation_tags[ChildOf])]
+                components=[Position], tags=[IsPlayer], relations=[(ChildOf, actor.relation_tag[ChildOf])]
             )
-            if my_fov.visible[target.components[Position].yx]
+            if game.actor_tools.can_see(actor, target)
         ]
         if not targets:
             return Impossible("No visible targets.")
         target = targets[0]
-        direction = (target.components[Position] - actor.components[Position]).chebyshev_normalize
-        return Bump([Direction(*direction.xy)]).plan(actor)
+        direction = game.pathfinding.step_towards(actor, actor.relation_tag[ChildOf], target.components[Position])
+        if direction is None:
+            return Impossible("No path to target.")
+        return Bump([direction]).plan(actor)
@@ -1,6 +1,5 @@
 """Tools for working with actors."""
 
-import itertools
 from collections.abc import Iterable
 
 import numpy as np
@@ -9,76 +8,172 @@
 from tcod.ecs import Entity
 
 import game.map_attrs
-from game.actor_types import ActiveFOV, Memory, MemoryLayer
+import game.map_tools
+import game.spatial
+from game.actor_types import OBJ_GRAPHIC, ActiveFOV, Memory, MemoryLayer
 from game.components import Context, Graphic, Position
 from game.map import Map
 from game.sched import Ticket
-from game.tags import IsActor
-from game.tiles import TileDB
+from game.tags import ChildOf, HasMemory, IsActor, SharesMemory
+from game.travel import force_move
+
+FOV_RADIUS = 10
+"""View radius of all actors."""
+FOV_ALGORITHM = tcod.constants.FOV_SYMMETRIC_SHADOWCAST
+"""The FOV algorithm used by all actors."""
+SYMMETRIC_FOV_ALGORITHMS = frozenset({tcod.constants.FOV_SYMMETRIC_SHADOWCAST})
+"""FOV algorithms where A seeing B guarantees that B sees A."""
 
 
 def new_actor(parent: Entity, components: Iterable[object] = (), tags: Iterable[object] = ()) -> Entity:
     """Spawn a new actor with the given components."""
     world = parent.world
     ctx = world[None].components[Context]
-    actor = world.new_entity([Position(0, 0), Graphic(), *components], tags=(IsActor, *tags))
+    actor = world.new_entity([Graphic(), *components], tags=(IsActor, *tags))
     actor.components[Ticket] = ctx.sched.schedule(0, actor)
     actor.components[("hp", int)] = actor.components[("max_hp", int)] = 10
     actor.components[("attack", int)] = 4
-
-    actor.relation_tags["ChildOf"] = parent
-    return actor
+    return force_move(actor, Position(0, 0), parent)
 
 
 def get_memory(actor: Entity) -> MemoryLayer:
-    """Return the actors memory of the active map."""
+    """Return the actors memory of the active map.
+
+    If the actor has a `SharesMemory` relation then the shared memory of that entity is returned instead.
+    """
     active_map = actor.world[None].components[Context].active_map
-    if Memory not in actor.components:
-        actor.components[Memory] = Memory()
-    memory = actor.components[Memory]
+    holder = actor.relation_tag.get(SharesMemory, actor)
+    if Memory not in holder.components:
+        holder.components[Memory] = Memory()
+    memory = holder.components[Memory]
     if active_map not in memory.layers:
+        map_data = active_map.components[Map]
         memory.layers[active_map] = MemoryLayer(
-            tiles=np.zeros_like(active_map.components[Map][game.map_attrs.a_tiles]),
-            objs={},
+            tiles=map_data.new_array(game.map_attrs.a_tiles.dtype),
+            objs=map_data.new_array(OBJ_GRAPHIC),
         )
     return memory.layers[active_map]
 
 
-def compute_fov(actor: Entity, update_memory: bool = True) -> ActiveFOV:
+def _fov_window(pos: Position, map_data: Map) -> tuple[slice, slice]:
+    """Return the area of `map_data` which can possibly be seen from `pos`."""
+    if FOV_RADIUS <= 0:
+        return slice(0, map_data.height), slice(0, map_data.width)
+    return (
+        slice(max(0, pos.y - FOV_RADIUS), min(map_data.height, pos.y + FOV_RADIUS + 1)),
+        slice(max(0, pos.x - FOV_RADIUS), min(map_data.width, pos.x + FOV_RADIUS + 1)),
+    )
+
+
+def _commit_memory(actor: Entity, fov: ActiveFOV) -> None:
+    """Commit every tile and object visible in `fov` to the memory of `actor`, as they are now.
+
+    Tiles which are not visible keep what was committed the last time they were, which is what the actor last saw.
+    """
+    memory = get_memory(actor)
+    window = fov.window
+    visible = fov.visible[window]
+    tiles = fov.active_map.components[Map][game.map_attrs.a_tiles][window]
+    memory.tiles[window] = np.where(visible, tiles, memory.tiles[window])
+    remembered_objs = np.where(visible, np.zeros((), dtype=memory.objs.dtype), memory.objs[window])
+
+    y_start, x_start = window[0].start, window[1].start
+    in_view = game.spatial.entities_in_rect(
+        fov.active_map, x_start, y_start, window[1].stop - x_start, window[0].stop - y_start
+    )
+    for obj in sorted(in_view, key=lambda obj: IsActor in obj.tags):  # Actors are remembered over other objects.
+        graphic = obj.components.get(Graphic)
+        if graphic is None:
+            continue
+        pos = obj.components[Position]
+        local_ij = pos.y - y_start, pos.x - x_start
+        if visible[local_ij]:
+            remembered_objs[local_ij] = graphic.ch, graphic.fg
+    memory.objs[window] = remembered_objs
+    fov.committed_generation = actor.world[None].components[Context].generation
+
+
+def compute_fov(actor: Entity, update_memory: bool | None = None) -> ActiveFOV:
     """Lazy compute the visible area from an actor and return the result.
 
     If `update_memory` is True then commit the viewed objects to memory.
+    By default memory is only updated for actors with the `HasMemory` tag.
+
+    Only the area within `FOV_RADIUS` of the actor is processed, so the cost does not depend on the map size.
+    Memory is committed again whenever `Context.generation` has changed, so it holds what was last seen:
+
+    >>> import game.world_tools, game.monsters
+    >>> from game.map import MapKey
+    >>> world = game.world_tools.new_world(seed=0)
+    >>> ctx = world[None].components[Context]
+    >>> first_map, player = ctx.active_map, ctx.player
+    >>> orc = game.monsters.spawn("orc", first_map, Position(5, 1))
+    >>> _ = compute_fov(player)
+    >>> orc.components[Position] = Position(15, 1)  # Walks out of view.
+    >>> ctx.generation += 1
+    >>> _ = compute_fov(player)
+    >>> objs = get_memory(player).objs["ch"]
+    >>> chr(objs[1, 5]), chr(objs[1, 15])
+    ('\\x00', '\\x00')
+    >>> orc.components[Position] = Position(3, 3)  # Comes back into view and dies there.
+    >>> orc.components[Graphic] = Graphic(ord("%"))
+    >>> ctx.generation += 1
+    >>> _ = compute_fov(player)
+    >>> def empty_map(map: Entity) -> Entity:
+    ...     return game.map_tools.init_map(map, 20, 20)
+    >>> second_map = game.map_tools.activate_map(world, MapKey(empty_map))
+    >>> _ = force_move(player, Position(1, 1), second_map)
+    >>> _ = compute_fov(player)
+    >>> chr(player.components[Memory].layers[first_map].objs["ch"][3, 3])
+    '%'
     """
     world = actor.world
     active_map = world[None].components[Context].active_map
     actor_pos = actor.components[Position]
-    fov = actor.components.get(ActiveFOV)
-    if fov and fov.active_map is active_map and fov.active_pos == actor_pos:
-        return fov
+    if update_memory is None:
+        update_memory = HasMemory in actor.tags
+    previous = actor.components.get(ActiveFOV)
+    map_data = active_map.components[Map]
+    tiles_version = map_data.version(game.map_attrs.a_tiles)
+    if (
+        previous
+        and previous.active_map is active_map
+        and previous.active_pos == actor_pos
+        and not map_data.changed_since(game.map_attrs.a_tiles, previous.tiles_version, previous.window)
+    ):
+        previous.tiles_version = tiles_version
+        if update_memory and previous.committed_generation != world[None].components[Context].generation:
+            _commit_memory(actor, previous)  # Something may have changed in view since the last commit.
+        return previous
 
-    tile_db = world[None].components[TileDB]
-    transparency = tile_db.data["transparent"][active_map.components[Map][game.map_attrs.a_tiles]]
+    window = _fov_window(actor_pos, map_data)
+    visible = map_data.new_bits()
+    visible[window] = tcod.map.compute_fov(
+        transparency=game.map_tools.get_tile_data(active_map, "transparent")[window],
+        pov=(actor_pos.y - window[0].start, actor_pos.x - window[1].start),
+        radius=FOV_RADIUS,
+        algorithm=FOV_ALGORITHM,
+    )
     fov = ActiveFOV(
-        visible=tcod.map.compute_fov(
-            transparency=transparency, pov=actor_pos.yx, radius=10, algorithm=tcod.constants.FOV_SYMMETRIC_SHADOWCAST
-        ),
-        active_map=active_map,
-        active_pos=actor_pos,
+        visible=visible, active_map=active_map, active_pos=actor_pos, window=window, tiles_version=tiles_version
     )
     if update_memory:
-        memory = get_memory(actor)
-        memory.tiles = np.where(fov.visible, active_map.components[Map][game.map_attrs.a_tiles], memory.tiles)
-
-        for old_pos in list(memory.objs.keys()):
-            if fov.visible[old_pos.yx]:
-                del memory.objs[old_pos]
-
-        for obj in itertools.chain(
-            world.Q.all_of([Position], relations=[("ChildOf", active_map)]),
-        ):
-            pos = obj.components[Position]
-            if fov.visible[pos.yx]:
-                memory.objs[pos] = obj
+        _commit_memory(actor, fov)
 
     actor.components[ActiveFOV] = fov
     return fov
+
+
+def can_see(actor: Entity, target: Entity) -> bool:
+    """Return True if `actor` can see `target`.
+
+    With a symmetric FOV algorithm this is answered from the FOV of `target` instead.
+    When `target` is the player this reuses the FOV which was already computed for their current position,
+    so any number of actors can check if they see the player without computing their own FOV.
+    This never commits memory, what the player remembers is committed when the player looks.
+    """
+    if actor.relation_tag.get(ChildOf) is not target.relation_tag.get(ChildOf):
+        return False
+    if FOV_ALGORITHM in SYMMETRIC_FOV_ALGORITHMS:
+        return bool(compute_fov(target, update_memory=False).visible[actor.components[Position].yx])
+    return bool(compute_fov(actor, update_memory=False).visible[target.components[Position].yx])
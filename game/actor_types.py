@@ -1,5 +1,6 @@
 """Classes related to actors."""
 
+from typing import Any
 from weakref import WeakKeyDictionary
 
 import attrs
@@ -7,15 +8,21 @@
 from numpy.typing import NDArray
 from tcod.ecs import Entity
 
+from game.chunked_map import ChunkedArray
 from game.components import Position
+from game.map import BitArray
+
+OBJ_GRAPHIC = np.dtype([("ch", np.intc), ("fg", "3B")])
+"""The remembered graphic of an object.  A `ch` of zero means no object is remembered."""
 
 
 @attrs.define()
 class MemoryLayer:
     """The recorded memory of a specific map."""
 
-    tiles: NDArray[np.intc]
-    objs: dict[Position, Entity]
+    tiles: NDArray[np.intc] | ChunkedArray
+    objs: NDArray[Any] | ChunkedArray
+    """The remembered objects of each tile as `OBJ_GRAPHIC`."""
 
 
 @attrs.define()
@@ -24,11 +31,24 @@ class Memory:
 
     layers: WeakKeyDictionary[Entity, MemoryLayer] = attrs.field(factory=WeakKeyDictionary)
 
+    def __getstate__(self) -> dict[str, Any]:
+        """Pickle `layers` as a plain dict, weak references can not be pickled."""
+        return {"layers": dict(self.layers)}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.layers = WeakKeyDictionary(state["layers"])
+
 
 @attrs.define(eq=False)
 class ActiveFOV:
     """The current FOV of an actor."""
 
-    visible: NDArray[np.bool_]
+    visible: BitArray
     active_map: Entity
     active_pos: Position
+    window: tuple[slice, slice]
+    """The area of `visible` which may be True, all other tiles are False."""
+    tiles_version: int
+    """The version of the map tiles this FOV was computed from."""
+    committed_generation: int | None = None
+    """The `Context.generation` when this FOV was last committed to the memory of its actor, None if never."""
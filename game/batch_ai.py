@@ -0,0 +1,162 @@
+"""Batched turns of actors using the `AttackPlayer` AI.
+
+When many hunting actors are due at the same time, their intents are planned together with array operations:
+which actors go dormant, which see the player, and which step each takes down the distance field.
+The planned actions are then performed one at a time in ticket order by `game.world_logic.until_player_turn`.
+
+Plans are made from the state before the batch.  The player, the tiles, and the player FOV do not change while the
+batch runs, only the occupancy of cells changes as actors move or die, so an actor is replanned with its own AI if an
+earlier actor of the batch changed any cell next to it.  This gives the same results as running every actor alone.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+import numpy as np
+from numpy.typing import NDArray
+from tcod.ecs import Entity, World
+
+import game.actor_tools
+import game.dormancy
+import game.pathfinding
+import game.spatial
+from game.action import Action, Impossible, PlanResult
+from game.actions import AttackPlayer, Bump
+from game.components import Context, Position
+from game.sched import Ticket
+from game.tags import ChildOf, IsActor, IsPlayer
+
+MIN_BATCH = 8
+"""Fewer due actors than this are run one at a time, which is faster than setting up the arrays."""
+
+_OFFSETS = np.array([(direction.y, direction.x) for direction in game.pathfinding.NEIGHBORS], dtype=np.intp)
+"""The `(y, x)` offset of each neighbor, in the order of `game.pathfinding.NEIGHBORS`."""
+_NEIGHBOR_INDEX = np.full((3, 3), -1, dtype=np.intp)
+"""The index in `_OFFSETS` of each `(y + 1, x + 1)` direction, -1 for no direction."""
+_NEIGHBOR_INDEX[_OFFSETS[:, 0] + 1, _OFFSETS[:, 1] + 1] = np.arange(len(_OFFSETS))
+_UNREACHABLE = np.iinfo(np.int64).max // 16
+"""Sorting key of neighbors which can not be stepped to."""
+
+
+class Unable(Action):
+    """An action which was planned to be impossible, with the reason as its data."""
+
+    def plan(self, actor: Entity) -> PlanResult:
+        return Impossible(self.data[str])
+
+
+def due_attackers(world: World) -> list[Entity]:
+    """Return the actors with the `AttackPlayer` AI which are due next, in ticket order.
+
+    Stops at the first due entity with any other AI, or none.
+    """
+    attackers = []
+    for ticket in world[None].components[Context].sched.due():
+        entity = ticket.value
+        assert isinstance(entity, Entity)
+        if type(entity.components.get(("ai", Action))) is not AttackPlayer:
+            break
+        attackers.append(entity)
+    return attackers
+
+
+def can_batch(world: World) -> bool:
+    """Return True if `plan_attacks` gives the same results as the actors would alone on the active map.
+
+    This needs a symmetric FOV, so visibility can be read from the player FOV, and a single player to hunt.
+    """
+    if game.actor_tools.FOV_ALGORITHM not in game.actor_tools.SYMMETRIC_FOV_ALGORITHMS:
+        return False
+    ctx = world[None].components[Context]
+    players = world.Q.all_of(components=[Position], tags=[IsPlayer], relations=[(ChildOf, ctx.active_map)])
+    return list(players) == [ctx.player]
+
+
+def _occupied(map: Entity, top: int, left: int, height: int, width: int) -> NDArray[np.bool_]:
+    """Return which cells of a window of `map` hold an actor."""
+    occupied = np.zeros((height, width), dtype=np.bool_)
+    for entity in game.spatial.entities_in_rect(map, left, top, width, height):
+        if IsActor in entity.tags:
+            pos = entity.components[Position]
+            occupied[pos.y - top, pos.x - left] = True
+    return occupied
+
+
+def plan_attacks(world: World, actors: Sequence[Entity]) -> list[Action | None]:
+    """Return the action of each of `actors` as planned by `AttackPlayer`, or None for actors which should sleep.
+
+    `can_batch` must be True.  Actors are planned as if none of them move before their turn.
+    """
+    ctx = world[None].components[Context]
+    map = ctx.active_map
+    player = ctx.player
+    goal = player.components[Position]
+    on_map = np.fromiter(
+        (actor.relation_tag.get(ChildOf) is map for actor in actors), dtype=np.bool_, count=len(actors)
+    )
+    yx = np.array([actor.components[Position].yx if on_map[i] else goal.yx for i, actor in enumerate(actors)])
+    yx = yx.reshape(len(actors), 2)
+    goal_yx = np.array(goal.yx)
+
+    sleeps = ~on_map | (np.abs(yx - goal_yx).max(axis=1) > game.dormancy.SLEEP_RADIUS)
+    if sleeps.all():
+        return [None] * len(actors)
+
+    fov = game.actor_tools.compute_fov(player, update_memory=False)
+    window_y, window_x = fov.window
+    local = yx - (window_y.start, window_x.start)
+    visible_window = np.asarray(fov.visible[fov.window], dtype=np.bool_)
+    in_window = ((local >= 0) & (local < visible_window.shape)).all(axis=1)
+    sees = np.zeros(len(actors), dtype=np.bool_)
+    sees[in_window] = visible_window[local[in_window, 0], local[in_window, 1]]
+
+    # Distance field gather of every neighbor, following `game.pathfinding.step_towards`.
+    distance = game.pathfinding.get_distance_field(map, goal).distance
+    height, width = distance.shape
+    neighbors = yx[:, np.newaxis, :] + _OFFSETS  # (actor, neighbor, yx)
+    in_bounds = ((neighbors >= 0) & (neighbors < (height, width))).all(axis=2)
+    neighbors_y = np.clip(neighbors[..., 0], 0, height - 1)
+    neighbors_x = np.clip(neighbors[..., 1], 0, width - 1)
+    neighbor_distance = distance[neighbors_y, neighbors_x].astype(np.int64)
+
+    top, left = max(0, int(yx[:, 0].min()) - 1), max(0, int(yx[:, 1].min()) - 1)
+    bottom, right = min(height, int(yx[:, 0].max()) + 2), min(width, int(yx[:, 1].max()) + 2)
+    occupied = _occupied(map, top, left, bottom - top, right - left)
+    blocked = occupied[
+        np.clip(neighbors_y - top, 0, bottom - top - 1), np.clip(neighbors_x - left, 0, right - left - 1)
+    ]
+    blocked &= ((neighbors_y != goal.y) | (neighbors_x != goal.x)) & in_bounds
+
+    can_step = in_bounds & ~blocked & (neighbor_distance < distance[yx[:, 0], yx[:, 1]][:, np.newaxis])
+    # Ties go to the direct step towards the goal, then to the first neighbor in order.
+    rank = np.broadcast_to(np.arange(1, len(_OFFSETS) + 1), can_step.shape).copy()
+    direct = _NEIGHBOR_INDEX[np.sign(goal_yx - yx)[:, 0] + 1, np.sign(goal_yx - yx)[:, 1] + 1]
+    has_direct = direct >= 0
+    rank[has_direct, direct[has_direct]] = 0
+    keys = np.where(can_step, neighbor_distance * 16 + rank, _UNREACHABLE)
+    steps = keys.argmin(axis=1)
+    has_step = keys[np.arange(len(actors)), steps] != _UNREACHABLE
+
+    actions: list[Action | None] = []
+    for i in range(len(actors)):
+        if sleeps[i]:
+            actions.append(None)
+        elif not sees[i]:
+            actions.append(Unable(["No visible targets."]))
+        elif not has_step[i]:
+            actions.append(Unable(["No path to target."]))
+        else:
+            actions.append(Bump([game.pathfinding.NEIGHBORS[steps[i]]]))
+    return actions
+
+
+def neighborhood(pos: Position) -> list[Position]:
+    """Return `pos` and every position next to it, the cells which affect the plan of an actor at `pos`."""
+    return [pos, *(pos + direction for direction in game.pathfinding.NEIGHBORS)]
+
+
+def is_next(world: World, actor: Entity) -> bool:
+    """Return True if `actor` holds the next ticket of the turn queue."""
+    ctx = world[None].components[Context]
+    return bool(ctx.sched.heap) and ctx.sched.peek() is actor.components.get(Ticket)
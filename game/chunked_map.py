@@ -0,0 +1,297 @@
+"""Sparse chunked map storage for very large maps.
+
+A `ChunkedMap` stores each attribute as a `ChunkedArray`, made of fixed-size square chunks which are only allocated
+when a value other than the attribute default is written to them.
+Chunks can be unloaded, which compresses them in memory, and they are loaded again when accessed.
+"""
+
+from __future__ import annotations
+
+import zlib
+from collections.abc import Container, Hashable, Iterable, Iterator
+from typing import Any
+
+import numpy as np
+from numpy.typing import DTypeLike, NDArray
+
+from game.map import BitArray, Map, MapAttribute, index_window
+
+CHUNK_SIZE = 32
+"""Default width and height of chunks."""
+
+_Index = tuple[int, int]
+"""The (i, j) index of a chunk."""
+
+
+class ChunkedArray:
+    """A 2D array stored as chunks which are allocated on demand.
+
+    This supports the subset of the NumPy API used for map attributes.
+    Indexing with integers and slices reads or writes that window, only the chunks overlapping it are touched.
+    Windows are returned as read-only copies, so they must be modified by assigning to the index directly.
+    Pairs of integer arrays are gathered and scattered per point.
+    Other indexes, such as boolean masks, raise IndexError instead of converting the entire array to a dense array.
+
+    >>> array = ChunkedArray((100, 100), np.uint8, chunk_size=10)
+    >>> array[5:15, 20] = 3
+    >>> array[4:7, 20]
+    array([0, 3, 3], dtype=uint8)
+    >>> array[4:7, 20][0] = 3
+    Traceback (most recent call last):
+      ...
+    ValueError: assignment destination is read-only
+    >>> array[np.array([4, 5]), np.array([20, 20])]
+    array([0, 3], dtype=uint8)
+    >>> array[array[:, :] == 3]
+    Traceback (most recent call last):
+      ...
+    IndexError: Only windows and pairs of integer arrays can index a ChunkedArray, got ndarray.
+    >>> sorted(array.chunks)
+    [(0, 2), (1, 2)]
+    >>> array[:, :] = 0  # Writing default values to unallocated chunks does not allocate them.
+    >>> sorted(array.chunks)
+    [(0, 2), (1, 2)]
+    """
+
+    ndim = 2
+
+    def __init__(
+        self, shape: tuple[int, int], dtype: DTypeLike, default: Any = 0, chunk_size: int = CHUNK_SIZE  # noqa: ANN401
+    ) -> None:
+        """Initialize an array filled with `default`."""
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+        self.chunk_size = chunk_size
+        self.chunks: dict[_Index, NDArray[Any]] = {}
+        """Loaded chunks.  Chunks always have the full chunk size, even at the edges of the array."""
+        self.packed: dict[_Index, bytes] = {}
+        """Unloaded chunks as compressed bytes."""
+        self._fill = np.full((chunk_size, chunk_size), default, dtype=self.dtype)
+        self._fill.flags.writeable = False
+
+    @property
+    def size(self) -> int:
+        return self.shape[0] * self.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        """The memory used by loaded and unloaded chunks."""
+        return sum(chunk.nbytes for chunk in self.chunks.values()) + sum(len(data) for data in self.packed.values())
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __array__(self, dtype: DTypeLike = None, copy: bool | None = None) -> NDArray[Any]:
+        """Return this entire array as a new dense array."""
+        dense = self._read(0, self.shape[0], 0, self.shape[1])
+        return dense if dtype is None else dense.astype(dtype)
+
+    def _overlaps(
+        self, y_start: int, y_stop: int, x_start: int, x_stop: int
+    ) -> Iterator[tuple[_Index, tuple[slice, slice], tuple[slice, slice]]]:
+        """Yield the chunks overlapping a window, with the slices of the window and of the chunk which overlap."""
+        size = self.chunk_size
+        for i in range(y_start // size, (y_stop - 1) // size + 1 if y_stop > y_start else 0):
+            top, bottom = max(y_start, i * size), min(y_stop, (i + 1) * size)
+            for j in range(x_start // size, (x_stop - 1) // size + 1 if x_stop > x_start else 0):
+                left, right = max(x_start, j * size), min(x_stop, (j + 1) * size)
+                yield (
+                    (i, j),
+                    (slice(top - y_start, bottom - y_start), slice(left - x_start, right - x_start)),
+                    (slice(top - i * size, bottom - i * size), slice(left - j * size, right - j * size)),
+                )
+
+    def _unpack(self, index: _Index) -> NDArray[Any]:
+        """Return a read-only copy of the unloaded chunk at `index` without loading it."""
+        return np.frombuffer(zlib.decompress(self.packed[index]), dtype=self.dtype).reshape(self._fill.shape)
+
+    def _get_chunk(self, index: _Index) -> NDArray[Any] | None:
+        """Return the chunk at `index`, loading it if it was unloaded.  Returns None if it was never allocated."""
+        chunk = self.chunks.get(index)
+        if chunk is None and index in self.packed:
+            chunk = self.chunks[index] = self._unpack(index).copy()
+            del self.packed[index]
+        return chunk
+
+    def _points(self, index: object) -> tuple[NDArray[np.intp], NDArray[np.intp]] | None:
+        """Return an index of two integer arrays as `(y, x)`, or None for other kinds of indexes."""
+        if not (isinstance(index, tuple) and len(index) == 2):  # noqa: PLR2004
+            return None
+        y, x = index
+        if not (isinstance(y, np.ndarray) and isinstance(x, np.ndarray)):
+            return None
+        if not (np.issubdtype(y.dtype, np.integer) and np.issubdtype(x.dtype, np.integer)):
+            return None
+        y, x = np.broadcast_arrays(y, x)
+        return np.where(y < 0, y + self.shape[0], y), np.where(x < 0, x + self.shape[1], x)
+
+    def _read(self, y_start: int, y_stop: int, x_start: int, x_stop: int) -> NDArray[Any]:
+        """Return a new dense copy of a window."""
+        out = np.empty((y_stop - y_start, x_stop - x_start), dtype=self.dtype)
+        for chunk_index, out_slice, chunk_slice in self._overlaps(y_start, y_stop, x_start, x_stop):
+            chunk = self._get_chunk(chunk_index)
+            out[out_slice] = (chunk if chunk is not None else self._fill)[chunk_slice]
+        return out
+
+    def _point_chunks(self, y: NDArray[np.intp], x: NDArray[np.intp]) -> Iterator[tuple[_Index, NDArray[np.bool_]]]:
+        """Yield the index of every chunk holding any of the points `(y, x)`, with a mask of the points it holds."""
+        i, j = y // self.chunk_size, x // self.chunk_size
+        for chunk_index in set(zip(i.ravel().tolist(), j.ravel().tolist(), strict=True)):
+            yield chunk_index, (i == chunk_index[0]) & (j == chunk_index[1])
+
+    def _window(self, index: object) -> tuple[tuple[int, int, int, int], tuple[bool, bool]]:
+        """Return the window of `index` as given by `index_window`, raising IndexError for other indexes."""
+        window = index_window(index, self.shape)
+        if window is None:
+            msg = f"Only windows and pairs of integer arrays can index a ChunkedArray, got {type(index).__name__}."
+            raise IndexError(msg)
+        return window
+
+    def __getitem__(self, index: object) -> Any:  # noqa: ANN401
+        points = self._points(index)
+        if points is not None:
+            y, x = points
+            out = np.empty(y.shape, dtype=self.dtype)
+            for chunk_index, selected in self._point_chunks(y, x):
+                chunk = self._get_chunk(chunk_index)
+                size = self.chunk_size
+                out[selected] = (chunk if chunk is not None else self._fill)[y[selected] % size, x[selected] % size]
+            return out
+        (y_start, y_stop, x_start, x_stop), squeeze = self._window(index)
+        out = self._read(y_start, y_stop, x_start, x_stop)
+        out.flags.writeable = False
+        return out[tuple(0 if squeezed else slice(None) for squeezed in squeeze)]
+
+    def __setitem__(self, index: object, value: Any) -> None:  # noqa: ANN401
+        points = self._points(index)
+        if points is not None:
+            y, x = points
+            values = np.broadcast_to(np.asarray(value, dtype=self.dtype), y.shape)
+            for chunk_index, selected in self._point_chunks(y, x):
+                chunk = self._get_chunk(chunk_index)
+                if chunk is None:
+                    chunk = self.chunks[chunk_index] = self._fill.copy()
+                chunk[y[selected] % self.chunk_size, x[selected] % self.chunk_size] = values[selected]
+            return
+        (y_start, y_stop, x_start, x_stop), squeeze = self._window(index)
+        height, width = y_stop - y_start, x_stop - x_start
+        reduced_shape = tuple(length for length, squeezed in zip((height, width), squeeze, strict=True) if not squeezed)
+        values = np.broadcast_to(np.asarray(value, dtype=self.dtype), reduced_shape).reshape(height, width)
+        for chunk_index, out_slice, chunk_slice in self._overlaps(y_start, y_stop, x_start, x_stop):
+            part = values[out_slice]
+            chunk = self._get_chunk(chunk_index)
+            if chunk is None:
+                if (part == self._fill[chunk_slice]).all():
+                    continue
+                chunk = self.chunks[chunk_index] = self._fill.copy()
+            chunk[chunk_slice] = part
+
+    def chunks_in_rect(self, x: int, y: int, width: int, height: int) -> set[_Index]:
+        """Return the indexes of all chunks overlapping a rectangle, which may extend outside of the array."""
+        top, bottom = max(0, y), min(self.shape[0], y + height)
+        left, right = max(0, x), min(self.shape[1], x + width)
+        return {chunk_index for chunk_index, _, _ in self._overlaps(top, bottom, left, right)}
+
+    def unload(self, keep: Container[_Index] = ()) -> int:
+        """Unload all loaded chunks except those in `keep` and return the number of chunks unloaded.
+
+        Chunks which only hold the default value are freed, other chunks are compressed.
+        """
+        unloaded = [index for index in self.chunks if index not in keep]
+        for index in unloaded:
+            chunk = self.chunks.pop(index)
+            if not (chunk == self._fill).all():
+                self.packed[index] = zlib.compress(chunk.tobytes(), 1)
+        return len(unloaded)
+
+    def map_chunks(self, func: Any, dtype: DTypeLike) -> ChunkedArray:  # noqa: ANN401
+        """Return a new array of `func` applied to every allocated chunk, such as a lookup table of tile data."""
+        default = np.asarray(func(self._fill))[0, 0]
+        result = ChunkedArray(self.shape, dtype, default, self.chunk_size)
+        for index, chunk in self.chunks.items():
+            result.chunks[index] = np.asarray(func(chunk), dtype=result.dtype)
+        for index in self.packed:
+            result.chunks[index] = np.asarray(func(self._unpack(index)), dtype=result.dtype)
+        return result
+
+
+class ChunkedMap(Map):
+    """A Map with attributes stored as `ChunkedArray`, so memory scales with the area written to.
+
+    `map[attr]` returns the `ChunkedArray` itself, windows of it are read and written by indexing it.
+
+    >>> map = ChunkedMap(1000, 1000)
+    >>> tiles = MapAttribute("tiles", np.uint8)
+    >>> map[tiles][500:502, 10] = 1
+    >>> map[tiles][499:503, 10]
+    array([0, 1, 1, 0], dtype=uint8)
+    >>> map[tiles].nbytes
+    1024
+    """
+
+    def __init__(self, width: int, height: int, chunk_size: int = CHUNK_SIZE) -> None:
+        super().__init__(width, height)
+        self.chunk_size = chunk_size
+        self._arrays: dict[Hashable, ChunkedArray] = {}
+
+    def __contains__(self, attr: MapAttribute) -> bool:
+        if attr.key not in self._arrays:
+            return False
+        assert self._arrays[attr.key].dtype == attr.dtype
+        return True
+
+    def __getitem__(self, attr: MapAttribute) -> ChunkedArray:  # type: ignore[override]
+        if attr.key not in self._arrays:
+            self._arrays[attr.key] = ChunkedArray((self.height, self.width), attr.dtype, attr.default, self.chunk_size)
+        array = self._arrays[attr.key]
+        assert array.dtype == attr.dtype
+        return array
+
+    def __setitem__(self, attr: MapAttribute, array: NDArray[Any] | ChunkedArray | BitArray) -> None:
+        assert attr.dtype == array.dtype, "Consider adding [:] for full array assignment."
+        if isinstance(array, ChunkedArray):
+            self._arrays[attr.key] = array
+        else:
+            self[attr][:, :] = array
+        self.touch(attr)
+
+    def __delitem__(self, attr: MapAttribute) -> None:
+        del self._arrays[attr.key]
+        self.touch(attr)
+
+    def new_array(self, dtype: DTypeLike, default: Any = 0) -> ChunkedArray:  # type: ignore[override]  # noqa: ANN401
+        return ChunkedArray((self.height, self.width), dtype, default, self.chunk_size)
+
+    def bits(self, attr: MapAttribute) -> ChunkedArray:  # type: ignore[override]
+        """Return the array of `attr`, chunks are already sparse so packed attributes are stored like any other."""
+        return self[attr]
+
+    def new_bits(self, default: bool = False) -> ChunkedArray:  # type: ignore[override]
+        return self.new_array(np.bool_, default)
+
+    def dense(self, *, packed: bool = True) -> dict[Hashable, NDArray[Any]]:
+        return {key: np.asarray(array) for key, array in self._arrays.items()}
+
+    def replace_dense(self, key: Hashable, array: NDArray[Any] | None) -> None:
+        if array is None:
+            self._arrays.pop(key, None)
+        else:
+            if key not in self._arrays or self._arrays[key].dtype != array.dtype:
+                self._arrays[key] = ChunkedArray((self.height, self.width), array.dtype, 0, self.chunk_size)
+            self._arrays[key][:, :] = array
+        self._bump(key, None)
+
+    def unload_outside(self, rects: Iterable[tuple[int, int, int, int]], arrays: Iterable[ChunkedArray] = ()) -> int:
+        """Unload every chunk of this map and of `arrays` which does not overlap any `(x, y, width, height)` rect.
+
+        `arrays` is for other arrays with the same shape as this map, such as memory layers.
+        Cached derived values which are chunked arrays, such as tile data, are unloaded too.
+        Returns the number of chunks unloaded.
+        """
+        rects = list(rects)
+        derived = [value for _, value in self._derived.values() if isinstance(value, ChunkedArray)]
+        unloaded = 0
+        for array in [*self._arrays.values(), *derived, *arrays]:
+            keep = set().union(*(array.chunks_in_rect(*rect) for rect in rects))
+            unloaded += array.unload(keep)
+        return unloaded
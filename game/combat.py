@@ -2,15 +2,17 @@
 
 from tcod.ecs import Entity
 
-from game.components import Graphic
+from game.components import Context, Graphic
 from game.sched import Ticket
-from game.tags import IsActor, IsPlayer
+from game.tags import IsActor, IsDormant, IsPlayer
 
 
 def kill(actor: Entity) -> None:
     """Invoke on-death logic for an actor."""
     print(f"{actor} dies.")
-    del actor.components[Ticket]
+    actor.world[None].components[Context].sched.cancel(actor)
+    actor.components.pop(Ticket, None)
+    actor.tags.discard(IsDormant)
     actor.tags.remove(IsActor)
     actor.components[Graphic] = Graphic(ord("%"), (127, 16, 16))
     if IsPlayer in actor.tags:
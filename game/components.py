@@ -17,7 +17,11 @@
 class Context:
     active_map: Entity = field(init=False)
     player: Entity = field(init=False)
-    sched: TurnQueue[Entity] = Factory(TurnQueue)
+    sched: TurnQueue[Entity] = Factory(lambda: TurnQueue(indexed=True))
+    generation: int = 0
+    """Incremented whenever an action is performed, so that renderers can tell when the world has changed."""
+    seed: int = 0
+    """World seed, every map is generated from this combined with the seed of its `MapKey`."""
 
 
 @attrs.define(frozen=True)
@@ -0,0 +1,107 @@
+"""Cache of compiled data files.
+
+Data files are compiled into a form which is fast to load, such as a parsed monster table or a decoded glyph atlas,
+and the result is pickled to `CACHE_DIR`.  Later loads use the cached result until the source file changes.
+A source is assumed unchanged if its size and modification time are the same, otherwise its content hash is checked.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import logging
+import pickle
+import tempfile
+from collections.abc import Callable, Iterable
+from pathlib import Path
+from typing import Concatenate, ParamSpec, TypeVar
+
+import attrs
+import numpy as np
+import tcod.tileset
+from numpy.typing import NDArray
+
+T = TypeVar("T")
+P = ParamSpec("P")
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(".cache")
+"""Directory of cached files, this can be deleted at any time."""
+CACHE_VERSION = 2
+"""Increase this when the output of any compiler changes, to discard all cached files."""
+
+
+@attrs.define(frozen=True)
+class _SourceStamp:
+    """Identifies the version of a source file."""
+
+    size: int
+    mtime_ns: int
+    digest: bytes
+
+
+def _digest(path: Path) -> bytes:
+    return hashlib.blake2b(path.read_bytes(), digest_size=16).digest()
+
+
+def load(source: Path, compile: Callable[Concatenate[Path, P], T], *args: P.args, **kwargs: P.kwargs) -> T:
+    """Return `compile(source, *args, **kwargs)`, using the cached result if `source` has not changed.
+
+    The cache is keyed by the compiler and its arguments, which must have a stable `repr`.
+    The result must be picklable plain data such as builtins and arrays, classes of this project should be built from
+    the result after loading it, otherwise a cached instance could be missing fields added to its class since.
+    Failing to write the cache is logged and otherwise ignored.
+    """
+    key = repr((CACHE_VERSION, compile.__module__, compile.__qualname__, str(source), args, sorted(kwargs.items())))
+    cache_path = CACHE_DIR / f"{source.name}-{hashlib.blake2b(key.encode(), digest_size=8).hexdigest()}.pickle"
+    stat = source.stat()
+
+    stale_errors = (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError)
+    with contextlib.suppress(*stale_errors), cache_path.open("rb") as file:
+        stamp = pickle.load(file)  # noqa: S301
+        unchanged = isinstance(stamp, _SourceStamp) and stamp.size == stat.st_size
+        if unchanged and (stamp.mtime_ns == stat.st_mtime_ns or stamp.digest == _digest(source)):
+            result: T = pickle.load(file)  # noqa: S301
+            return result
+
+    result = compile(source, *args, **kwargs)
+    stamp = _SourceStamp(stat.st_size, stat.st_mtime_ns, _digest(source))
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile("wb", dir=CACHE_DIR, suffix=".tmp", delete=False) as out:
+            pickle.dump(stamp, out, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(result, out, protocol=pickle.HIGHEST_PROTOCOL)
+        Path(out.name).replace(cache_path)  # Other processes may be loading the same file.
+    except OSError:
+        logger.warning("Could not write the content cache for %s", source, exc_info=True)
+    return result
+
+
+@attrs.define
+class GlyphAtlas:
+    """The decoded tiles of a tilesheet."""
+
+    tiles: NDArray[np.uint8]
+    """RGBA tiles with the shape `(count, height, width, 4)`."""
+    codepoints: list[int]
+    """The codepoint of each tile."""
+
+    def to_tileset(self) -> tcod.tileset.Tileset:
+        """Return a new tileset with these tiles."""
+        tileset = tcod.tileset.Tileset(self.tiles.shape[2], self.tiles.shape[1])
+        for codepoint, tile in zip(self.codepoints, self.tiles, strict=True):
+            tileset.set_tile(codepoint, tile)
+        return tileset
+
+
+def _compile_tilesheet(path: Path, columns: int, rows: int, charmap: list[int]) -> tuple[NDArray[np.uint8], list[int]]:
+    """Decode a tilesheet image into the tiles and codepoints of a glyph atlas."""
+    tileset = tcod.tileset.load_tilesheet(path, columns, rows, charmap)
+    codepoints = charmap[: columns * rows]
+    return np.stack([tileset.get_tile(codepoint) for codepoint in codepoints]), codepoints
+
+
+def load_tilesheet(path: Path, columns: int, rows: int, charmap: Iterable[int]) -> tcod.tileset.Tileset:
+    """Cached version of `tcod.tileset.load_tilesheet`, a charmap is required."""
+    return GlyphAtlas(*load(path, _compile_tilesheet, columns, rows, list(charmap))).to_tileset()
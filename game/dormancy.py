@@ -0,0 +1,77 @@
+"""Dormant actor scheduling.
+
+Actors which are far from the player, on an inactive map, or have nothing to do are taken off the turn queue
+and marked with `IsDormant`.  They are woken by events near them, such as the player coming within range or noise.
+This keeps the cost of a turn proportional to the number of actors near the player.
+"""
+
+from __future__ import annotations
+
+from tcod.ecs import Entity
+
+import game.spatial
+from game.components import Context, Position
+from game.sched import Ticket
+from game.tags import ChildOf, IsActor, IsDormant, IsPlayer
+
+WAKE_RADIUS = 10
+"""Dormant actors within this distance of the player are woken after every player action.
+
+This should be at least `game.actor_tools.FOV_RADIUS` so that actors wake before the player can see them.
+"""
+SLEEP_RADIUS = WAKE_RADIUS * 2
+"""Actors further than this from the player go dormant instead of taking their turn."""
+
+
+def sleep(actor: Entity) -> None:
+    """Remove `actor` from the turn queue until it is woken."""
+    if IsDormant in actor.tags:
+        return
+    actor.world[None].components[Context].sched.cancel(actor)
+    actor.components.pop(Ticket, None)
+    actor.tags.add(IsDormant)
+
+
+def wake(actor: Entity, delay: int = 0) -> None:
+    """Return a dormant `actor` to the turn queue, it will act after `delay`."""
+    if IsDormant not in actor.tags:
+        return
+    actor.tags.remove(IsDormant)
+    actor.components[Ticket] = actor.world[None].components[Context].sched.schedule(delay, actor)
+
+
+def wake_near(map: Entity, pos: Position, radius: int) -> int:
+    """Wake all dormant actors on `map` within `radius` of `pos`.  Returns the number of actors woken."""
+    woken = 0
+    for actor in game.spatial.entities_in_rect(map, pos.x - radius, pos.y - radius, radius * 2 + 1, radius * 2 + 1):
+        if IsDormant in actor.tags and IsActor in actor.tags:
+            wake(actor)
+            woken += 1
+    return woken
+
+
+def sleep_map(map: Entity) -> None:
+    """Put all scheduled non-player actors on `map` to sleep, used when the map is deactivated."""
+    for actor in map.world.Q.all_of(components=[Ticket], tags=[IsActor], relations=[(ChildOf, map)]):
+        if IsPlayer not in actor.tags:
+            sleep(actor)
+
+
+def sleep_outside(map: Entity) -> None:
+    """Put all scheduled non-player actors which are not on `map` to sleep, used when `map` is activated.
+
+    Only the turn queue is checked, so this does not need to know which map was active before.
+    """
+    for ticket in list(map.world[None].components[Context].sched.heap):
+        actor = ticket.value
+        if IsActor in actor.tags and IsPlayer not in actor.tags and actor.relation_tag.get(ChildOf) is not map:
+            sleep(actor)
+
+
+def should_sleep(actor: Entity) -> bool:
+    """Return True if `actor` is out of range of the player and should go dormant instead of taking its turn."""
+    ctx = actor.world[None].components[Context]
+    if actor.relation_tag.get(ChildOf) is not ctx.active_map:
+        return True
+    distance = actor.components[Position] - ctx.player.components[Position]
+    return max(abs(distance.x), abs(distance.y)) > SLEEP_RADIUS
@@ -1,6 +1,7 @@
 """Generic interface to bind keyboard inputs to program commands."""
 
 import enum
+import heapq
 from collections import defaultdict
 from collections.abc import Callable, Iterable
 from typing import Any, Self, TypeVar
@@ -24,6 +25,13 @@
 
 _MOD_DECODE = {v: k for k, v in _MOD_ENCODE.items()}
 
+_MOD_MASKS = {
+    "alt": (tcod.event.KMOD_ALT, tcod.event.KMOD_LALT, tcod.event.KMOD_RALT),
+    "ctrl": (tcod.event.KMOD_CTRL, tcod.event.KMOD_LCTRL, tcod.event.KMOD_RCTRL),
+    "gui": (tcod.event.KMOD_GUI, tcod.event.KMOD_LGUI, tcod.event.KMOD_RGUI),
+}
+"""Modifier masks for either, left, and right keys by modifier name."""
+
 
 @attrs.define(frozen=True, kw_only=True)
 class Bind:
@@ -51,13 +59,10 @@ def __match_modifier(self, name: str, event: tcod.event.KeyboardEvent) -> bool:
         self_value: None | bool | tuple[bool, bool] = getattr(self, name)
         if self_value is None:
             return True
-        upper_name = name.upper()
+        either_mask, left_mask, right_mask = _MOD_MASKS[name]
         if isinstance(self_value, bool):
-            return self_value == bool(event.mod & getattr(tcod.event, f"KMOD_{upper_name}"))
-        return self_value == (
-            bool(event.mod & getattr(tcod.event, f"KMOD_L{upper_name}")),
-            bool(event.mod & getattr(tcod.event, f"KMOD_R{upper_name}")),
-        )
+            return self_value == bool(event.mod & either_mask)
+        return self_value == (bool(event.mod & left_mask), bool(event.mod & right_mask))
 
     @property
     def value(self) -> int:
@@ -148,14 +153,59 @@ def _as_toml_str(self) -> str:
         return f"""{{ {", ".join(output)} }}"""
 
 
+_Candidate = tuple[int, int, Bind, enum.Enum]
+"""A bind and its value, prefixed by its sort key of negative `Bind.value` and insertion order."""
+
+
+class _DispatchTable:
+    """The binds of one enum indexed by the key they match, each index sorted by bind priority."""
+
+    def __init__(self, binds: dict[Bind, enum.Enum]) -> None:
+        """Index `binds`, binds with a sym are indexed by sym even if they also have a scancode."""
+        self.by_sym: dict[tcod.event.KeySym, list[_Candidate]] = defaultdict(list)
+        self.by_scancode: dict[tcod.event.Scancode, list[_Candidate]] = defaultdict(list)
+        self.wildcard: list[_Candidate] = []
+        for index, (bind, value) in enumerate(binds.items()):
+            candidate = (-bind.value, index, bind, value)
+            if bind.sym is not None:
+                self.by_sym[bind.sym].append(candidate)
+            elif bind.scancode is not None:
+                self.by_scancode[bind.scancode].append(candidate)
+            else:
+                self.wildcard.append(candidate)
+        for candidates in (*self.by_sym.values(), *self.by_scancode.values(), self.wildcard):
+            candidates.sort(key=lambda candidate: candidate[:2])
+        self.by_key: dict[tuple[tcod.event.KeySym, tcod.event.Scancode], list[_Candidate]] = {}
+        """Cache of the merged candidates for each sym and scancode pair."""
+
+    def get(self, sym: tcod.event.KeySym, scancode: tcod.event.Scancode) -> list[_Candidate]:
+        """Return the binds which could match a key, in priority order."""
+        candidates = self.by_key.get((sym, scancode))
+        if candidates is None:
+            candidates = self.by_key[sym, scancode] = list(
+                heapq.merge(
+                    self.by_sym.get(sym, ()),
+                    self.by_scancode.get(scancode, ()),
+                    self.wildcard,
+                    key=lambda candidate: candidate[:2],
+                )
+            )
+        return candidates
+
+
 class Keybindings:
-    """A collection of keybindings."""
+    """A collection of keybindings.
+
+    Binds are compiled into a dispatch table for each enum the first time that enum is parsed.
+    Tables are discarded when binds are added or loaded, `binds` should not be modified directly.
+    """
 
     def __init__(self) -> None:
         """Initialize an empty Keybindings object."""
         self.binds: dict[type[enum.Enum], dict[Bind, enum.Enum]] = defaultdict(dict)
         self.enums: dict[str, type[enum.Enum]] = {}
         self.toggle_shift = False
+        self._dispatch: dict[type[enum.Enum], _DispatchTable] = {}
 
     def register(self, category: str | None = None) -> Callable[[type[_Enum]], type[_Enum]]:
         """Register an Enum class for keybinding. This is a decorator method."""
@@ -163,6 +213,7 @@ def register(self, category: str | None = None) -> Callable[[type[_Enum]], type[
         def func(__enum: type[_Enum]) -> type[_Enum]:
             self.binds[__enum] = {}
             self.enums[__enum.__name__] = __enum
+            self._dispatch.pop(__enum, None)
             return __enum
 
         return func
@@ -177,6 +228,7 @@ def loads(self, /, string: str) -> None:
             for name, binds in bindings.items():
                 for bind in binds:
                     self.binds[enum_type][Bind._from_toml_str(bind)] = enum_type[name]
+        self._dispatch.clear()
 
     def dumps(self) -> str:
         """Dump keybindings to a string."""
@@ -198,6 +250,7 @@ def dumps(self) -> str:
     def add_bind(self, enum: enum.Enum, bind: Bind) -> None:
         """Add a single binding."""
         self.binds[type(enum)][bind] = enum
+        self._dispatch.pop(type(enum), None)
 
     def add_binds(self, bindings: dict[enum.Enum, Iterable[Bind]]) -> None:
         """Add multiple keybindings at once."""
@@ -205,13 +258,16 @@ def add_binds(self, bindings: dict[enum.Enum, Iterable[Bind]]) -> None:
             enum_type = type(value)
             for bind in binds:
                 self.binds[enum_type][bind] = value
+            self._dispatch.pop(enum_type, None)
 
     def parse(self, event: tcod.event.Event, enum: type[_Enum]) -> _Enum | None:
         """Return the enum value matching the provided event or None on no match."""
         if not isinstance(event, tcod.event.KeyboardEvent):
             return None
-        binds = self.binds[enum]
-        for bind, value in sorted(binds.items(), key=lambda x: x[0].value, reverse=True):
+        table = self._dispatch.get(enum)
+        if table is None:
+            table = self._dispatch[enum] = _DispatchTable(self.binds[enum])
+        for _, _, bind, value in table.get(event.sym, event.scancode):
             if bind.match(event, self.toggle_shift):
                 assert isinstance(value, enum)
                 return value
@@ -1,25 +1,203 @@
 """Defines the Map class."""
 
+from __future__ import annotations
+
+import hashlib
 import inspect
+from collections import deque
 from collections.abc import Callable, Hashable
 from typing import Any, Concatenate, ParamSpec, TypeVar
 
 import attrs
 import numpy as np
-from numpy.typing import DTypeLike, NDArray
+from numpy.typing import ArrayLike, DTypeLike, NDArray
 from tcod.ecs import Entity
 
 T = TypeVar("T")
 P = ParamSpec("P")
 
+Window = tuple[slice, slice]
+"""A rectangular `(y_slice, x_slice)` area of a map, with non-negative bounds and no step."""
+
+
+def windows_overlap(a: Window, b: Window) -> bool:
+    """Return True if two windows share any cell."""
+    return bool(
+        max(a[0].start, b[0].start) < min(a[0].stop, b[0].stop)
+        and max(a[1].start, b[1].start) < min(a[1].stop, b[1].stop)
+    )
+
+
+def index_window(index: object, shape: tuple[int, int]) -> tuple[tuple[int, int, int, int], tuple[bool, bool]] | None:
+    """Convert a 2D `index` to a `(y_start, y_stop, x_start, x_stop)` window and which axes are integer indexes.
+
+    Returns None for indexes which are not integers or unit step slices.
+    Raises IndexError if an integer index is out of bounds.
+
+    >>> index_window((5, slice(None, -2)), (10, 20))
+    ((5, 6, 0, 18), (True, False))
+    """
+    items = list(index) if isinstance(index, tuple) else [index]
+    ellipsis = [i for i, item in enumerate(items) if item is Ellipsis]  # Not `in`, which compares arrays by value.
+    if ellipsis:
+        at = ellipsis[0]
+        items[at : at + 1] = [slice(None)] * (len(shape) - len(items) + 1)
+    items += [slice(None)] * (len(shape) - len(items))
+    if len(items) != len(shape):
+        return None
+    bounds: list[int] = []
+    squeeze: list[bool] = []
+    for item, length in zip(items, shape, strict=True):
+        if isinstance(item, int | np.integer):
+            i = int(item) + length if item < 0 else int(item)
+            if not 0 <= i < length:
+                msg = f"Index {item} is out of bounds for axis with size {length}"
+                raise IndexError(msg)
+            bounds += [i, i + 1]
+            squeeze.append(True)
+        elif isinstance(item, slice):
+            start, stop, step = item.indices(length)
+            if step != 1:
+                return None
+            bounds += [start, max(start, stop)]
+            squeeze.append(False)
+        else:
+            return None
+    return (bounds[0], bounds[1], bounds[2], bounds[3]), (squeeze[0], squeeze[1])
+
 
 class MapAttribute:
-    """A generic map attribute used as a key for generic maps."""
+    """A generic map attribute used as a key for generic maps.
 
-    def __init__(self, key: Hashable | None, dtype: DTypeLike, default: Any = 0) -> None:  # noqa: ANN401
+    Boolean attributes can be `packed`, storing 8 cells per byte in a `BitArray`.
+    Packed attributes are accessed with `Map.bits` instead of indexing the map.
+    """
+
+    def __init__(
+        self, key: Hashable | None, dtype: DTypeLike, default: Any = 0, *, packed: bool = False  # noqa: ANN401
+    ) -> None:
         self.key = key if key is not None else self
         self.dtype = np.dtype(dtype)
         self.default = default
+        self.packed = packed
+        assert not packed or self.dtype == np.bool_, "Only boolean attributes can be packed."
+
+
+class BitArray:
+    """A 2D boolean array packed into bits along its rows, using one eighth of the memory of a boolean array.
+
+    Like `game.chunked_map.ChunkedArray`, indexing with integers and slices returns a read-only copy of that window,
+    only the bytes overlapping the window are unpacked.  Writes must assign to an index directly.
+    Pairs of integer arrays are gathered and scattered without unpacking anything.
+
+    >>> array = BitArray((4, 20))
+    >>> array[1:3, 6:10] = True
+    >>> array[2, 4:12]
+    array([False, False,  True,  True,  True,  True, False, False])
+    >>> array[np.array([1, 3]), np.array([9, 9])]
+    array([ True, False])
+    >>> array[np.array([3]), np.array([0])] = True
+    >>> int(array.count_nonzero()), array.nbytes
+    (9, 12)
+    """
+
+    ndim = 2
+    dtype = np.dtype(np.bool_)
+
+    def __init__(self, shape: tuple[int, int], default: bool = False) -> None:
+        """Initialize an array filled with `default`."""
+        self.shape = shape
+        if default:
+            self.bits = np.packbits(np.ones(shape, dtype=np.bool_), axis=1, bitorder="little")
+        else:
+            self.bits = np.zeros((shape[0], (shape[1] + 7) // 8), dtype=np.uint8)
+        """The packed bits, least significant bit first.  Padding bits at the end of each row are always zero."""
+
+    @classmethod
+    def from_array(cls, array: ArrayLike) -> BitArray:
+        """Return a new packed copy of a 2D `array`."""
+        dense = np.asarray(array, dtype=np.bool_)
+        self = cls((dense.shape[0], dense.shape[1]))
+        self.bits = np.packbits(dense, axis=1, bitorder="little")
+        return self
+
+    @property
+    def size(self) -> int:
+        return self.shape[0] * self.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __array__(self, dtype: DTypeLike = None, copy: bool | None = None) -> NDArray[Any]:
+        """Return this entire array unpacked."""
+        dense = np.unpackbits(self.bits, axis=1, count=self.shape[1], bitorder="little").view(np.bool_)
+        return dense if dtype is None else dense.astype(dtype)
+
+    def count_nonzero(self) -> int:
+        """Return the number of True cells."""
+        return int(_POPCOUNT[self.bits].sum(dtype=np.intp))
+
+    def _points(self, index: object) -> tuple[NDArray[np.intp], NDArray[np.intp]] | None:
+        """Return an index of two integer arrays as `(y, x)`, or None for other kinds of indexes."""
+        if not (isinstance(index, tuple) and len(index) == 2):  # noqa: PLR2004
+            return None
+        y, x = index
+        if not (isinstance(y, np.ndarray) and isinstance(x, np.ndarray)):
+            return None
+        if not (np.issubdtype(y.dtype, np.integer) and np.issubdtype(x.dtype, np.integer)):
+            return None
+        y, x = np.broadcast_arrays(y, x)
+        return np.where(y < 0, y + self.shape[0], y), np.where(x < 0, x + self.shape[1], x)
+
+    def __getitem__(self, index: object) -> Any:  # noqa: ANN401
+        points = self._points(index)
+        if points is not None:
+            y, x = points
+            return (self.bits[y, x >> 3] >> (x & 7) & 1).astype(np.bool_)
+        window = index_window(index, self.shape)
+        if window is None:
+            return np.asarray(self)[index]  # type: ignore[call-overload]
+        (y_start, y_stop, x_start, x_stop), squeeze = window
+        if squeeze == (True, True):
+            return np.bool_(self.bits[y_start, x_start >> 3] >> (x_start & 7) & 1)
+        byte_start = x_start >> 3
+        out = np.unpackbits(self.bits[y_start:y_stop, byte_start : (x_stop + 7) >> 3], axis=1, bitorder="little").view(
+            np.bool_
+        )[:, x_start - byte_start * 8 : x_stop - byte_start * 8]
+        out.flags.writeable = False
+        return out[tuple(0 if squeezed else slice(None) for squeezed in squeeze)]
+
+    def __setitem__(self, index: object, value: Any) -> None:  # noqa: ANN401
+        points = self._points(index)
+        if points is not None:
+            y, x = points
+            values = np.broadcast_to(np.asarray(value, dtype=np.bool_), y.shape)
+            masks = (1 << (x & 7)).astype(np.uint8)
+            np.bitwise_and.at(self.bits, (y, x >> 3), ~masks)
+            np.bitwise_or.at(self.bits, (y[values], x[values] >> 3), masks[values])
+            return
+        window = index_window(index, self.shape)
+        if window is None:
+            dense = np.asarray(self)
+            dense[index] = value
+            self.bits = np.packbits(dense, axis=1, bitorder="little")
+            return
+        (y_start, y_stop, x_start, x_stop), squeeze = window
+        height, width = y_stop - y_start, x_stop - x_start
+        reduced_shape = tuple(length for length, squeezed in zip((height, width), squeeze, strict=True) if not squeezed)
+        values = np.broadcast_to(np.asarray(value, dtype=np.bool_), reduced_shape).reshape(height, width)
+        byte_start, byte_stop = x_start >> 3, (x_stop + 7) >> 3
+        block = np.unpackbits(self.bits[y_start:y_stop, byte_start:byte_stop], axis=1, bitorder="little")
+        block[:, x_start - byte_start * 8 : x_stop - byte_start * 8] = values
+        self.bits[y_start:y_stop, byte_start:byte_stop] = np.packbits(block, axis=1, bitorder="little")
+
+
+_POPCOUNT = np.array([i.bit_count() for i in range(256)], dtype=np.uint8)
+"""The number of set bits of each byte value."""
 
 
 class Map:
@@ -38,31 +216,268 @@ class Map:
     1
     >>> monster = {"my_explored_attr": MapAttribute(None, np.bool8)}  # Define anonymous attribute.
     >>> map[monster["my_explored_attr"]][:] = 0
+
+    In-place changes must be followed by `touch` so that derived data knows to refresh.
+
+    >>> map.version(tiles)
+    0
+    >>> map[tiles][0, 0] = 2
+    >>> map.touch(tiles)
+    >>> map.version(tiles)
+    1
+    >>> map.derive("tiles_sum", map.version(tiles), lambda: int(map[tiles].sum()))
+    101
+
+    Tracked attributes keep a journal of the areas changed by each version.
+
+    >>> map.track(tiles)
+    >>> map.write(tiles, (slice(2, 4), 5), 3)
+    >>> map.changes_since(tiles, 1)
+    [(slice(2, 4, None), slice(5, 6, None))]
+    >>> map.changed_since(tiles, 1, (slice(0, 2), slice(0, 10)))
+    False
+
+    Packed boolean attributes are stored as a `BitArray`.
+
+    >>> explored = MapAttribute("explored", np.bool_, packed=True)
+    >>> map.bits(explored)[3:5, :] = True
+    >>> map.bits(explored).nbytes
+    20
     """
 
     def __init__(self, width: int, height: int) -> None:
         self.width, self.height = width, height
         self._data: dict[Hashable, NDArray[Any]] = {}
+        self._packed: dict[Hashable, BitArray] = {}
+        """Arrays of packed attributes."""
+        self._versions: dict[Hashable, int] = {}
+        """Modification counters of attributes, missing keys are version 0."""
+        self._derived: dict[Hashable, tuple[Hashable, Any]] = {}
+        """Cached values derived from this map, stored as `{key: (version, value)}`."""
+        self._journals: dict[Hashable, deque[tuple[int, Window]]] = {}
+        """Recent changes of tracked attributes as `(version, window)`, oldest first."""
+
+    def __getstate__(self) -> dict[str, Any]:
+        """Pickle this map without its derived values, they are recomputed when next requested."""
+        return {**self.__dict__, "_derived": {}}
 
     def __contains__(self, attr: MapAttribute) -> bool:
+        if attr.key in self._packed:
+            return True
         if attr.key not in self._data:
             return False
         assert self._data[attr.key].dtype == attr.dtype
         return True
 
     def __getitem__(self, attr: MapAttribute) -> NDArray[Any]:
+        assert not attr.packed, "Packed attributes are accessed with Map.bits."
         if attr.key not in self._data:
             self._data[attr.key] = np.full((self.height, self.width), fill_value=attr.default, dtype=attr.dtype)
         array = self._data[attr.key]
         assert array.dtype == attr.dtype
         return array
 
-    def __setitem__(self, attr: MapAttribute, array: NDArray[Any]) -> None:
+    def __setitem__(self, attr: MapAttribute, array: NDArray[Any] | BitArray) -> None:
         assert attr.dtype == array.dtype, "Consider adding [:] for full array assignment."
-        self._data[attr.key] = array
+        if attr.packed:
+            self._data.pop(attr.key, None)
+            self._packed[attr.key] = array if isinstance(array, BitArray) else BitArray.from_array(array)
+        else:
+            assert isinstance(array, np.ndarray)
+            self._data[attr.key] = array
+        self.touch(attr)
 
     def __delitem__(self, attr: MapAttribute) -> None:
-        del self._data[attr.key]
+        if attr.key in self._packed:
+            del self._packed[attr.key]
+        else:
+            del self._data[attr.key]
+        self.touch(attr)
+
+    def bits(self, attr: MapAttribute) -> BitArray:
+        """Return the array of the packed attribute `attr`."""
+        assert attr.packed
+        array = self._packed.get(attr.key)
+        if array is None:
+            dense = self._data.pop(attr.key, None)  # Restored by `replace_dense`, which does not know it is packed.
+            if dense is not None:
+                array = BitArray.from_array(dense)
+            else:
+                array = BitArray((self.height, self.width), attr.default)
+            self._packed[attr.key] = array
+        return array
+
+    def new_array(self, dtype: DTypeLike, default: Any = 0) -> NDArray[Any]:  # noqa: ANN401
+        """Return a new array with the shape of this map, for data stored outside of the map such as memory."""
+        return np.full((self.height, self.width), fill_value=default, dtype=dtype)
+
+    def new_bits(self, default: bool = False) -> BitArray:
+        """Return a new packed boolean array with the shape of this map, such as for a field of view."""
+        return BitArray((self.height, self.width), default)
+
+    def dense(self, *, packed: bool = True) -> dict[Hashable, NDArray[Any]]:
+        """Return the arrays of all allocated attributes by attribute key.
+
+        Packed attributes are returned as unpacked copies, or are skipped if `packed` is False.
+        """
+        if not packed:
+            return dict(self._data)
+        return {**self._data, **{key: np.asarray(array) for key, array in self._packed.items()}}
+
+    def replace_dense(self, key: Hashable, array: NDArray[Any] | None) -> None:
+        """Replace the array of the attribute `key`, or remove the attribute if `array` is None."""
+        if array is None:
+            self._data.pop(key, None)
+            self._packed.pop(key, None)
+        elif key in self._packed:
+            self._packed[key] = BitArray.from_array(array)
+        else:
+            self._data[key] = array
+        self._bump(key, None)
+
+    def clear_derived(self) -> None:
+        """Discard all cached derived values, they will be recomputed when next requested."""
+        self._derived.clear()
+
+    def version(self, attr: MapAttribute) -> int:
+        """Return the modification counter of `attr`.  This increases every time `attr` is touched."""
+        return self._versions.get(attr.key, 0)
+
+    def touch(self, attr: MapAttribute, window: Window | None = None) -> None:
+        """Mark `attr` as modified.  Must be called after modifying the array of `attr` in-place.
+
+        `window` is the area which was modified, if not given then the entire map is assumed to have changed.
+        """
+        self._bump(attr.key, window)
+
+    def _bump(self, key: Hashable, window: Window | None) -> None:
+        """Increment the version of the attribute `key` and journal the changed `window` if it is tracked."""
+        version = self._versions[key] = self._versions.get(key, 0) + 1
+        journal = self._journals.get(key)
+        if journal is not None:
+            journal.append((version, window or (slice(0, self.height), slice(0, self.width))))
+
+    def track(self, attr: MapAttribute, limit: int = 64) -> None:
+        """Start journaling the changes to `attr`, remembering the areas changed by the last `limit` versions."""
+        if attr.key not in self._journals:
+            self._journals[attr.key] = deque(maxlen=limit)
+
+    def write(self, attr: MapAttribute, index: Any, value: Any) -> None:  # noqa: ANN401
+        """Assign `value` to `index` of `attr` and touch the area which was written.
+
+        `index` is a tuple of integers and slices, other indexes are assumed to change the entire map.
+        """
+        (self.bits(attr) if attr.packed else self[attr])[index] = value
+        window = index_window(index, (self.height, self.width))
+        self.touch(attr, (slice(*window[0][:2]), slice(*window[0][2:])) if window is not None else None)
+
+    def changes_since(self, attr: MapAttribute, version: int) -> list[Window] | None:
+        """Return the windows of `attr` changed after `version`, or None if they are not known.
+
+        Changes are only known for tracked attributes and only for as long as the journal remembers them.
+        """
+        if version == self.version(attr):
+            return []
+        journal = self._journals.get(attr.key)
+        if not journal or journal[0][0] > version + 1:
+            return None
+        return [window for changed_version, window in journal if changed_version > version]
+
+    def changed_since(self, attr: MapAttribute, version: int, window: Window) -> bool:
+        """Return True if `attr` may have changed within `window` after `version`."""
+        changes = self.changes_since(attr, version)
+        return changes is None or any(windows_overlap(window, changed) for changed in changes)
+
+    def derive(self, key: Hashable, version: Hashable, func: Callable[[], T]) -> T:
+        """Return a cached value derived from this map, calling `func` to recompute it when `version` changes.
+
+        `version` should combine the versions of everything the value depends on.
+        Only the latest value of each `key` is kept.
+        """
+        cached = self._derived.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]  # type: ignore[no-any-return]
+        value = func()
+        self._derived[key] = (version, value)
+        return value
+
+    def derive_incremental(
+        self,
+        key: Hashable,
+        attr: MapAttribute,
+        version: Hashable,
+        func: Callable[[], T],
+        update: Callable[[T, list[Window]], None],
+    ) -> T:
+        """Return a cached value derived from `attr`, updating only the changed areas of it when possible.
+
+        `func` computes the value from scratch and `update` updates an old value in-place from the changed windows.
+        `version` is the version of everything else the value depends on, changing it forces `func` to be called.
+        """
+        cached = self._derived.get(key)
+        if cached is not None:
+            cached_version: tuple[int, Hashable] = cached[0]  # type: ignore[assignment]
+            changes = self.changes_since(attr, cached_version[0]) if cached_version[1] == version else None
+            if changes is not None:
+                value: T = cached[1]
+                if changes:
+                    update(value, changes)
+                    self._derived[key] = ((self.version(attr), version), value)
+                return value
+        value = func()
+        self._derived[key] = ((self.version(attr), version), value)
+        return value
+
+
+@attrs.define
+class MapDelta:
+    """The differences of a map from another map of the same size, usually the map as it was first generated.
+
+    >>> base = Map(4, 4)
+    >>> tiles = MapAttribute("tiles", np.uint8)
+    >>> current = Map(4, 4)
+    >>> current[tiles][1, 2] = 5
+    >>> delta = MapDelta.between(base, current)
+    >>> delta.apply(base)
+    >>> base[tiles][1, 2]
+    5
+    """
+
+    arrays: dict[Hashable, tuple[NDArray[np.intp], NDArray[Any]] | None] = attrs.field(factory=dict)
+    """The changed elements of each attribute as `(flat_indexes, values)`, or None if the attribute was deleted."""
+
+    @classmethod
+    def between(cls, base: Map, current: Map) -> MapDelta:
+        """Return the delta which turns `base` into `current`."""
+        assert (base.width, base.height) == (current.width, current.height)
+        arrays: dict[Hashable, tuple[NDArray[np.intp], NDArray[Any]] | None] = {}
+        base_arrays = base.dense()
+        current_arrays = current.dense()
+        for key, array in current_arrays.items():
+            base_array = base_arrays.get(key)
+            if base_array is None or base_array.dtype != array.dtype:
+                changed = np.arange(array.size)
+            else:
+                changed = np.flatnonzero(base_array != array)
+            if changed.size:
+                arrays[key] = changed, array.ravel()[changed]
+        for key in base_arrays.keys() - current_arrays.keys():
+            arrays[key] = None
+        return cls(arrays)
+
+    def apply(self, map: Map) -> None:
+        """Apply the changes of this delta to `map`."""
+        arrays = map.dense()
+        for key, change in self.arrays.items():
+            if change is None:
+                map.replace_dense(key, None)
+                continue
+            indexes, values = change
+            array = arrays.get(key)
+            if array is None or array.dtype != values.dtype:
+                array = np.zeros((map.height, map.width), dtype=values.dtype)
+            array.ravel()[indexes] = values
+            map.replace_dense(key, array)
 
 
 @attrs.define(frozen=True, init=False)
@@ -78,3 +493,13 @@ def __init__(self, generator: Callable[Concatenate[Entity, P], Entity], *args: P
         signature = signature.replace(parameters=list(signature.parameters.values())[1:])
         bound_kwargs = signature.bind(*args, **kwargs).arguments
         self.__attrs_init__(generator, frozenset(bound_kwargs.items()))
+
+    @property
+    def seed(self) -> int:
+        """A 64-bit seed derived from the generator name and arguments.
+
+        Unlike `hash`, this is the same in every process and every run.
+        """
+        name = f"{self.generator.__module__}.{self.generator.__qualname__}"
+        data = repr((name, sorted(self.kwargs))).encode("utf-8")
+        return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
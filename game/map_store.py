@@ -0,0 +1,155 @@
+"""On-disk storage of inactive maps.
+
+Only the most recently active maps are kept in memory.  Older maps have their arrays and the memory layers of those
+maps written to `.npy` files, and the arrays are replaced with memory-mapped views of those files,
+so the operating system can page them out.  The maps stay fully usable while spilled.
+When a spilled map is activated again its arrays are read back into memory.
+
+The store is opt-in, see `enable`.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import os
+import shutil
+import tempfile
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from numpy.typing import NDArray
+from tcod.ecs import Entity, World
+
+from game.actor_types import Memory, MemoryLayer
+from game.chunked_map import ChunkedArray, ChunkedMap
+from game.components import Context
+from game.map import Map, MapKey
+
+logger = logging.getLogger(__name__)
+
+
+class MapStore:
+    """Tracks which maps are resident in memory, stored as a component of the global entity.
+
+    Spilled files are written to a new temporary directory within `cache_dir`, which is deleted with this object.
+    """
+
+    def __init__(self, cache_dir: Path | None = None, max_resident: int = 4, *, eager: bool = True) -> None:
+        """Initialize a store keeping `max_resident` maps in memory.
+
+        If `eager` is False then reactivated maps keep using their memory-mapped files instead of being reloaded.
+        """
+        assert max_resident >= 1
+        self.cache_dir = cache_dir
+        self.max_resident = max_resident
+        self.eager = eager
+        self.resident: OrderedDict[MapKey, None] = OrderedDict()
+        """Resident maps from least to most recently activated."""
+        self.path = Path(tempfile.mkdtemp(prefix="maps-", dir=cache_dir))
+        """Directory of the spilled files of this store."""
+        weakref.finalize(self, shutil.rmtree, self.path, ignore_errors=True)
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        """Pickle only the configuration of this store, spilled arrays are saved as ordinary arrays."""
+        return self.__class__, (self.cache_dir, self.max_resident), {"eager": self.eager}
+
+
+def enable(world: World, cache_dir: Path | None = None, max_resident: int = 4, *, eager: bool = True) -> None:
+    """Limit the number of maps of `world` kept in memory to `max_resident`.  `world` must have an active map."""
+    world[None].components[MapStore] = MapStore(cache_dir, max_resident, eager=eager)
+    on_activate(world[None].components[Context].active_map)
+
+
+def memory_layers(map: Entity) -> list[MemoryLayer]:
+    """Return every memory layer of `map`."""
+    layers = (holder.components[Memory].layers.get(map) for holder in map.world.Q.all_of(components=[Memory]))
+    return [layer for layer in layers if layer is not None]
+
+
+def _spill_array(array: NDArray[Any], path: Path, prefix: str) -> NDArray[Any]:
+    """Write `array` to a new file in `path` and return a writable memory-mapped view of it."""
+    if isinstance(array, np.memmap):
+        array.flush()
+        return array
+    fd, filename = tempfile.mkstemp(suffix=".npy", prefix=prefix, dir=path)
+    os.close(fd)
+    np.save(filename, array, allow_pickle=False)
+    spilled: NDArray[Any] = np.load(filename, mmap_mode="r+")
+    return spilled
+
+
+def _load_array(array: NDArray[Any]) -> NDArray[Any]:
+    """Return an in-memory copy of a memory-mapped `array` and delete its file."""
+    if not isinstance(array, np.memmap):
+        return array
+    loaded = np.array(array)
+    if array.filename is not None:
+        with contextlib.suppress(OSError):  # Files still mapped can not be removed on some platforms.
+            Path(array.filename).unlink(missing_ok=True)
+    return loaded
+
+
+def spill_map(map: Entity, path: Path) -> None:
+    """Write the arrays of `map` and its memory layers to files in `path` and replace them with memory-maps.
+
+    Chunked maps are not written to disk, all of their chunks are unloaded instead.
+    """
+    key = map.uid
+    assert isinstance(key, MapKey)
+    map_data = map.components[Map]
+    map_data.clear_derived()
+    prefix = f"{key.seed:016x}-"
+    if isinstance(map_data, ChunkedMap):
+        layer_arrays = [array for layer in memory_layers(map) for array in (layer.tiles, layer.objs)]
+        map_data.unload_outside((), [array for array in layer_arrays if isinstance(array, ChunkedArray)])
+        return
+    for attr_key, array in map_data.dense(packed=False).items():  # Packed attributes are small and stay resident.
+        spilled = _spill_array(array, path, prefix)
+        if spilled is not array:
+            map_data.replace_dense(attr_key, spilled)
+    for layer in memory_layers(map):
+        assert isinstance(layer.tiles, np.ndarray)
+        assert isinstance(layer.objs, np.ndarray)
+        layer.tiles = _spill_array(layer.tiles, path, f"{prefix}memory-")
+        layer.objs = _spill_array(layer.objs, path, f"{prefix}memory-")
+
+
+def load_map(map: Entity) -> None:
+    """Read the spilled arrays of `map` and its memory layers back into memory."""
+    map_data = map.components[Map]
+    if isinstance(map_data, ChunkedMap):
+        return
+    for attr_key, array in map_data.dense(packed=False).items():
+        if isinstance(array, np.memmap):
+            map_data.replace_dense(attr_key, _load_array(array))
+    for layer in memory_layers(map):
+        assert isinstance(layer.tiles, np.ndarray)
+        assert isinstance(layer.objs, np.ndarray)
+        layer.tiles = _load_array(layer.tiles)
+        layer.objs = _load_array(layer.objs)
+
+
+def on_activate(map: Entity) -> None:
+    """Mark `map` as the most recently active map, spilling the least recently active maps over the limit.
+
+    Does nothing unless the store is enabled.
+    """
+    world = map.world
+    store = world[None].components.get(MapStore)
+    if store is None:
+        return
+    key = map.uid
+    assert isinstance(key, MapKey)
+    if store.eager:
+        load_map(map)
+    store.resident[key] = None
+    store.resident.move_to_end(key)
+    while len(store.resident) > store.max_resident:
+        oldest, _ = store.resident.popitem(last=False)
+        if Map in world[oldest].components:  # Could have been evicted with `game.map_tools.evict_map`.
+            logger.debug("Spilling %r to %s", oldest, store.path)
+            spill_map(world[oldest], store.path)
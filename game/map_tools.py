@@ -1,32 +1,189 @@
 """Tools for working with maps."""
 
+from typing import Any
+
+import attrs
+import numpy as np
+from numpy.typing import NDArray
 from tcod.ecs import Entity, World
 
+import game.dormancy
+import game.map_store
+import game.pregen
 from game import map_attrs
-from game.components import Context
-from game.map import Map, MapKey
+from game.chunked_map import ChunkedArray, ChunkedMap
+from game.components import Context, Position
+from game.map import Map, MapDelta, MapKey, Window
+from game.spatial import SpatialIndex
+from game.tags import ChildOf
 from game.tiles import TileDB
 
+STREAM_RADIUS = 64
+"""Chunks of a chunked map are kept loaded within this distance of the player and of scheduled actors."""
+
+
+@attrs.define
+class EvictedMap:
+    """The changes made to an evicted map, stored on the map entity so that the map can be rebuilt by `get_map`."""
+
+    delta: MapDelta
+    """Changes to the map arrays since generation."""
+    entities: "list[game.pregen.EntityRecipe]"
+    """Every entity which was on the map when it was evicted."""
 
-def init_map(entity: Entity, width: int, height: int) -> Entity:
-    """Return a new map with a simple blank default."""
+
+def init_map(entity: Entity, width: int, height: int, *, chunked: bool = False) -> Entity:
+    """Return a new map with a simple blank default.
+
+    If `chunked` is True then the map is a `ChunkedMap`, for very large maps.
+    """
     tile_db = entity.world[None].components[TileDB]
-    map = entity.components[Map] = Map(width, height)
+    map = entity.components[Map] = ChunkedMap(width, height) if chunked else Map(width, height)
     map[map_attrs.a_tiles][:] = tile_db["wall"]
     map[map_attrs.a_tiles][1:-1, 1:-1] = tile_db["floor"]
+    map.touch(map_attrs.a_tiles)
+    map.track(map_attrs.a_tiles)
     return entity
 
 
+def tile_data_version(map: Entity) -> tuple[int, int]:
+    """Return a version for data derived from the tiles of `map`, this changes when the tiles or TileDB change."""
+    return map.components[Map].version(map_attrs.a_tiles), map.world[None].components[TileDB].version
+
+
+def get_tile_data(map: Entity, field: str) -> NDArray[Any] | ChunkedArray:
+    """Return the `field` of `game.tiles.TILE_DTYPE` for every tile of `map`, such as "transparent" or "walk_cost".
+
+    The result is cached on the Map.  Only the journaled changes to the tiles are updated when the tiles change,
+    and it is rebuilt when the TileDB changes.
+    The returned array is read-only.  A `ChunkedArray` is returned for chunked maps.
+    """
+    map_data = map.components[Map]
+    tile_db = map.world[None].components[TileDB]
+    table = tile_db.data[field]
+    tiles = map_data[map_attrs.a_tiles]
+
+    def derive() -> NDArray[Any] | ChunkedArray:
+        if isinstance(tiles, ChunkedArray):
+            return tiles.map_chunks(table.__getitem__, table.dtype)
+        array: NDArray[Any] = table[tiles]
+        array.flags.writeable = False
+        return array
+
+    def update(array: NDArray[Any] | ChunkedArray, windows: list[Window]) -> None:
+        if isinstance(array, ChunkedArray):
+            for window in windows:
+                array[window] = table[tiles[window]]
+            return
+        array.flags.writeable = True
+        for window in windows:
+            array[window] = table[tiles[window]]
+        array.flags.writeable = False
+
+    return map_data.derive_incremental(("tile_data", field), map_attrs.a_tiles, tile_db.version, derive, update)
+
+
+def map_rng(map: Entity) -> np.random.Generator:
+    """Return a new random generator for generating `map`.
+
+    It is seeded from the world seed and the `MapKey` of `map`, so a map generates the same way every time.
+    """
+    assert isinstance(map.uid, MapKey)
+    return np.random.default_rng([map.world[None].components[Context].seed, map.uid.seed])
+
+
 def get_map(world: World, key: MapKey) -> Entity:
-    """Return a map from a MapKey, generating it if required."""
+    """Return a map from a MapKey, generating it if required.
+
+    A map generated in the background by `game.pregen` is used if one is pending.
+    An evicted map is rebuilt the same way, generating it again only if it was not pregenerated,
+    and then has its recorded changes reapplied.
+    """
     map = world[key]
-    if "IsGenerated" not in map.tags:
+    if "IsGenerated" in map.tags:
+        return map
+    evicted = map.components.pop(EvictedMap, None)
+    if evicted is not None:
+        generated = game.pregen.take_generated(world, key)
+        if generated is None:
+            tile_db, seed = world[None].components[TileDB], world[None].components[Context].seed
+            generated = game.pregen.generate(key, tile_db, seed)
+        map.components[Map] = generated.map.components[Map]
+        evicted.delta.apply(map.components[Map])
+        game.pregen.spawn_recipes(world, evicted.entities)
+    elif game.pregen.take(world, key) is None:
         key.generator(map, **dict(key.kwargs))
-        map.tags.add("IsGenerated")
+    map.tags.add("IsGenerated")
     return map
 
 
+def unload_distant_chunks(map: Entity) -> int:
+    """Unload the chunks of a chunked map which are not within `STREAM_RADIUS` of the player or a scheduled actor.
+
+    Memory layers of the map are unloaded the same way.  Returns the number of chunks unloaded.
+    Unloaded chunks are loaded again when they are accessed, this only limits the memory used by distant areas.
+    This only sweeps the map when the player has entered a different chunk since the last sweep,
+    and only scheduled actors are checked, so the cost does not depend on the number of dormant actors.
+    """
+    map_data = map.components[Map]
+    if not isinstance(map_data, ChunkedMap):
+        return 0
+    ctx = map.world[None].components[Context]
+    player_pos = ctx.player.components[Position]
+    player_chunk = (player_pos.y // map_data.chunk_size, player_pos.x // map_data.chunk_size)
+    if map.components.get(("streamed_chunk", tuple[int, int])) == player_chunk:
+        return 0
+    map.components[("streamed_chunk", tuple[int, int])] = player_chunk
+    scheduled = (ticket.value for ticket in ctx.sched.heap)
+    positions = [
+        player_pos,
+        *(actor.components[Position] for actor in scheduled if actor.relation_tag.get(ChildOf) is map),
+    ]
+    size = STREAM_RADIUS * 2 + 1
+    rects = [(pos.x - STREAM_RADIUS, pos.y - STREAM_RADIUS, size, size) for pos in positions]
+    arrays = [
+        array
+        for layer in game.map_store.memory_layers(map)
+        for array in (layer.tiles, layer.objs)
+        if isinstance(array, ChunkedArray)
+    ]
+    return map_data.unload_outside(rects, arrays)
+
+
+def evict_map(map: Entity, generated: "game.pregen.GeneratedMap") -> None:
+    """Free an inactive map and its entities, keeping only its changes since `generated`.
+
+    `generated` is the map as it was first generated, see `game.pregen.evict_stale`.
+    The map entity itself is kept.  It is rebuilt the next time it is accessed with `get_map`.
+    Actors on the map are dormant when the map is rebuilt.
+    """
+    world = map.world
+    assert map.uid == generated.key
+    assert map is not world[None].components[Context].active_map, "The active map can not be evicted."
+    if "IsGenerated" not in map.tags:
+        return
+    game.dormancy.sleep_map(map)
+    current = game.pregen.export_map(map)
+    delta = MapDelta.between(generated.map.components[Map], map.components[Map])
+    for entity in reversed(game.pregen.get_descendants(map)):
+        entity.clear()
+    map.components.pop(Map)
+    map.components.pop(SpatialIndex, None)
+    map.tags.remove("IsGenerated")
+    map.components[EvictedMap] = EvictedMap(delta, current.entities)
+
+
 def activate_map(world: World, key: MapKey) -> Entity:
-    """Set a map as active and return it."""
+    """Set a map as active and return it.
+
+    Actors on the previously active map go dormant.
+    Maps reachable from the new map are pregenerated if `game.pregen` is enabled,
+    and the least recently active maps are evicted if it was enabled with a limit.
+    The least recently active maps are spilled to disk if `game.map_store` is enabled.
+    """
     world[None].components[Context].active_map = new_map = get_map(world, key)
+    game.dormancy.sleep_outside(new_map)
+    game.map_store.on_activate(new_map)
+    game.pregen.request_neighbors(new_map)
+    game.pregen.evict_stale(new_map)
     return new_map
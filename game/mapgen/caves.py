@@ -1,10 +1,11 @@
-"""Cellular automata cave generator."""
+"""Cellular automata cave generator.
+
+SciPy is imported when a cave is first generated instead of with this module, since it is slow to import.
+"""
 
 from typing import Any
 
 import numpy as np
-import scipy.ndimage  # type: ignore
-import scipy.signal  # type: ignore
 from numpy.typing import NDArray
 from tcod.ecs import Entity
 
@@ -22,19 +23,26 @@
 
 def get_holes(input: NDArray[Any]) -> NDArray[np.bool_]:
     """Return a boolean map for all sections which are holes."""
-    label, num_features = scipy.ndimage.label(input, [[0, 1, 0], [1, 1, 1], [0, 1, 0]])
-    max_label = np.argmax([np.sum(label == i) for i in range(1, num_features + 1)]) + 1
+    import scipy.ndimage  # type: ignore  # noqa: PLC0415
+
+    label, _ = scipy.ndimage.label(input, [[0, 1, 0], [1, 1, 1], [0, 1, 0]])
+    max_label = np.argmax(np.bincount(label.ravel())[1:]) + 1
     label[label == max_label] = 0
     return label != 0  # type: ignore[no-any-return]
 
 
-def new_cave(map: Entity, level: int) -> Entity:
+def new_cave(  # noqa: PLR0913
+    map: Entity, level: int, width: int = 50, height: int = 50, monsters: int = 10, *, chunked: bool = False
+) -> Entity:
+    """Generate a cave, as a `game.chunked_map.ChunkedMap` if `chunked` is True."""
+    import scipy.signal  # type: ignore  # noqa: PLC0415
+
     world = map.world
     assert level > 0
     tiles_db = world[None].components[TileDB]
-    rng = np.random.default_rng()
+    rng = game.map_tools.map_rng(map)
 
-    game.map_tools.init_map(map, 50, 50)
+    game.map_tools.init_map(map, width, height, chunked=chunked)
     walls = np.zeros((map.components[Map].height - 2, map.components[Map].width - 2), bool)
 
     walls.ravel()[: walls.size * 45 // 100] = 1
@@ -64,6 +72,7 @@ def new_cave(map: Entity, level: int) -> Entity:
     walls = np.pad(walls, 1, constant_values=True)
 
     map.components[Map][map_attrs.a_tiles][:] = np.array([tiles_db["floor"], tiles_db["wall"]])[walls.astype(int)]
+    map.components[Map].touch(map_attrs.a_tiles)
     free_spaces_ = np.argwhere(walls.T == 0)
     rng.shuffle(free_spaces_)
     free_spaces = free_spaces_.tolist()
@@ -75,13 +84,7 @@ def new_cave(map: Entity, level: int) -> Entity:
         map,
     )
 
-    for _ in range(10):
-        ai_actor = game.monsters.spawn("orc", map, Position(*free_spaces.pop()))
-        ai_actor.components.update(
-            {
-                ("ai", Action): AttackPlayer(),
-            }
-        )
-        ai_actor.components[("attack", int)] = 2
+    positions = [Position(*free_spaces.pop()) for _ in range(min(monsters, len(free_spaces)))]
+    game.monsters.spawn_many("orc", map, positions, {("ai", Action): AttackPlayer()})
 
     return map
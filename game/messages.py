@@ -1,5 +1,17 @@
 """Message log management."""
 
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import textwrap
+import weakref
+from collections import deque
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
 import attrs
 
 
@@ -9,6 +21,8 @@ class Message:
 
     text: str
     count: int = 1
+    _wrapped: tuple[int, int, list[str]] | None = attrs.field(default=None, init=False, repr=False, eq=False)
+    """Cached `(width, count, lines)` of the last call to `wrap`."""
 
     def __str__(self) -> str:
         """Return this message."""
@@ -16,16 +30,129 @@ def __str__(self) -> str:
             return f"{self.text} (x{self.count})"
         return self.text
 
+    def wrap(self, width: int) -> list[str]:
+        """Return the lines of this message wrapped to `width`.
+
+        The result is cached until `width` or `count` changes and should not be modified.
+        """
+        if self._wrapped is None or self._wrapped[:2] != (width, self.count):
+            self._wrapped = (width, self.count, textwrap.wrap(str(self), width) or [""])
+        return self._wrapped[2]
+
 
 @attrs.define
 class MessageLog:
-    """The active message log."""
+    """The active message log.
+
+    Only the last `capacity` messages are kept in memory, older messages are appended to a history file as they are
+    dropped, in batches of `history_batch` messages, one JSON string per line.
+    Pickling a log flushes it first.  A temporary history file is pickled with its contents.
+
+    >>> import pickle
+    >>> log = MessageLog(capacity=2, history_batch=2)
+    >>> for text in ["First", "Multiple\\nlines", "Third", "Third", "Last"]:
+    ...     log.append(text)
+    >>> list(log.history())
+    ['First', 'Multiple\\nlines', 'Third (x2)', 'Last']
+    >>> list(pickle.loads(pickle.dumps(log)).history())
+    ['First', 'Multiple\\nlines', 'Third (x2)', 'Last']
+    """
+
+    capacity: int = 1000
+    """Maximum number of messages kept in memory."""
+    history_path: Path | None = None
+    """Text file which messages dropped from `log` are appended to.
+
+    If None then a temporary file is used, which is created when it is first needed and deleted with this log.
+    """
+    log: deque[Message] = attrs.field(factory=deque)
+    history_batch: int = 100
+    """Number of dropped messages to hold before appending them to the history file."""
+    _dropped: list[str] = attrs.field(factory=list, init=False, repr=False)
+    """Dropped messages not yet written to the history file."""
+    _temporary_path: Path | None = attrs.field(default=None, init=False, repr=False)
+    """The temporary history file, if `history_path` is None and any messages were written."""
+
+    def __attrs_post_init__(self) -> None:
+        """Bound the log to `capacity`."""
+        self.log = deque(self.log, maxlen=self.capacity)
 
-    log: list[Message] = attrs.field(factory=list)
+    def __getstate__(self) -> dict[str, Any]:
+        """Flush this log and return its state, including the contents of a temporary history file."""
+        self.flush()
+        state: dict[str, Any] = {
+            "capacity": self.capacity,
+            "history_path": self.history_path,
+            "log": self.log,
+            "history_batch": self.history_batch,
+            "dropped": [],
+        }
+        if self.history_path is None:
+            state["dropped"] = list(self._read_history())
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        """Restore a pickled log, a temporary history is written to a new temporary file as messages are dropped."""
+        self.capacity = state["capacity"]
+        self.history_path = state["history_path"]
+        self.log = state["log"]
+        self.history_batch = state["history_batch"]
+        self._dropped = state["dropped"]
+        self._temporary_path = None
+
+    def _history_file(self) -> Path:
+        """Return the file to write dropped messages to, creating a temporary file if needed."""
+        if self.history_path is not None:
+            return self.history_path
+        if self._temporary_path is None:
+            fd, filename = tempfile.mkstemp(suffix=".jsonl", prefix="messages-")
+            os.close(fd)
+            self._temporary_path = Path(filename)
+            weakref.finalize(self, self._temporary_path.unlink, missing_ok=True)
+        return self._temporary_path
+
+    def _read_history(self) -> Iterator[str]:
+        """Iterate over the messages written to the history file."""
+        path = self.history_path if self.history_path is not None else self._temporary_path
+        if path is None or not path.exists():
+            return
+        with path.open(encoding="utf-8") as file:
+            for line in file:
+                text = json.loads(line)
+                assert isinstance(text, str)
+                yield text
 
     def append(self, text: str) -> None:
         """Add or stack a new message."""
         if self.log and self.log[-1].text == text:
             self.log[-1].count += 1
             return
+        if len(self.log) == self.capacity:
+            self._dropped.append(str(self.log[0]))
+            if len(self._dropped) >= self.history_batch:
+                self.flush()
         self.log.append(Message(text))
+
+    def flush(self) -> None:
+        """Append the dropped messages held in memory to the history file."""
+        if not self._dropped:
+            return
+        with self._history_file().open("a", encoding="utf-8") as file:
+            file.writelines(f"{json.dumps(text)}\n" for text in self._dropped)  # Escapes any newlines in messages.
+        self._dropped.clear()
+
+    def history(self) -> Iterator[str]:
+        """Iterate over every message in order, including those written to the history file."""
+        self.flush()
+        yield from self._read_history()
+        for message in self.log:
+            yield str(message)
+
+    def last_lines(self, width: int, count: int) -> list[str]:
+        """Return up to `count` of the most recent lines of the log wrapped to `width`, oldest first."""
+        lines: list[str] = []
+        for message in reversed(self.log):
+            if len(lines) >= count:
+                break
+            lines[:0] = message.wrap(width)
+        return lines[-count:] if count > 0 else []
@@ -3,16 +3,18 @@
 from __future__ import annotations
 
 import tomllib
-from collections.abc import Iterable
+from collections.abc import Iterable, Mapping
 from pathlib import Path
 from typing import Any
 
 import attrs
 from tcod.ecs import Entity
 
+import game.content_cache
 from game.components import Context, Graphic, Position
 from game.sched import Ticket
-from game.tags import IsActor
+from game.tags import HasMemory, IsActor, SharesMemory
+from game.travel import force_move
 
 
 def _convert_ch(value: str | int) -> int:
@@ -37,37 +39,96 @@ class MonsterType:
     attack: int = attrs.field(converter=int)
     ch: int = attrs.field(default=ord("?"), converter=_convert_ch)
     fg: tuple[int, int, int] = attrs.field(default=(255, 255, 255), converter=_convert_color)
+    memory: bool = attrs.field(default=False, converter=bool)
+    """If True then this creature remembers what it has seen."""
+    faction: str | None = None
+    """Creatures with memory in the same faction share a single memory."""
 
 
 monster_db: dict[str, MonsterType] = {}
 """Monster database."""
 
 
+def _parse_monsters(path: Path) -> dict[str, dict[str, Any]]:
+    """Parse a monster database file into plain data."""
+    return tomllib.loads(path.read_text("utf-8"))
+
+
 def init() -> None:
-    """Initialize the monster database."""
-    data: dict[str, Any]
-    for name, data in tomllib.loads(Path("data/monsters.toml").read_text(encoding="utf-8")).items():
-        monster_db[name] = MonsterType(name=name, **data)
+    """Initialize the monster database, parsing it only if it has changed since it was cached.
+
+    Only the parsed TOML is cached, so that changes to `MonsterType` never load stale objects.
+    """
+    parsed = game.content_cache.load(Path("data/monsters.toml"), _parse_monsters)
+    monster_db.update({name: MonsterType(name=name, **data) for name, data in parsed.items()})
+
+
+@attrs.define(frozen=True)
+class Prefab:
+    """The initial components and tags of a monster, compiled once from its `MonsterType`."""
+
+    components: Mapping[Any, object]
+    tags: frozenset[Any]
+    faction: str | None
+    """The faction whose memory is shared, if any."""
+
+    @classmethod
+    def compile(cls, race_info: MonsterType) -> Prefab:
+        """Return the prefab of `race_info`."""
+        tags = {IsActor, HasMemory} if race_info.memory else {IsActor}
+        return cls(
+            components={
+                Graphic: Graphic(race_info.ch, race_info.fg),
+                ("name", str): race_info.name,
+                ("hp", int): race_info.hp,
+                ("max_hp", int): race_info.hp,
+                ("attack", int): race_info.attack,
+            },
+            tags=frozenset(tags),
+            faction=race_info.faction if race_info.memory else None,
+        )
+
+
+prefab_db: dict[str, Prefab] = {}
+"""Compiled prefabs of `monster_db`, filled as they are needed."""
+
+
+def get_prefab(race: str) -> Prefab:
+    """Return the prefab of `race`, compiling it if needed."""
+    prefab = prefab_db.get(race)
+    if prefab is None:
+        if not monster_db:
+            init()
+        prefab = prefab_db[race] = Prefab.compile(monster_db[race])
+    return prefab
+
+
+def spawn_many(
+    race: str, parent: Entity, positions: Iterable[Position], components: Mapping[Any, object] | None = None
+) -> list[Entity]:
+    """Spawn a monster at each of `positions` and return them.
+
+    `components` are added to every monster in addition to those of its prefab, such as an AI.
+    Their values are shared by every monster and should not be modified in-place.
+    All monsters are scheduled to act immediately, with the turn queue rebuilt only once.
+    """
+    prefab = get_prefab(race)
+    world = parent.world
+    initial = {**prefab.components, **components} if components else prefab.components
+    memory_holder = world[("faction", prefab.faction)] if prefab.faction is not None else None
+    actors: list[Entity] = []
+    for pos in positions:
+        actor = world.new_entity(initial, tags=prefab.tags)
+        if memory_holder is not None:
+            actor.relation_tag[SharesMemory] = memory_holder
+        actors.append(force_move(actor, pos, parent))
+    tickets = world[None].components[Context].sched.schedule_many(0, actors)
+    for actor, ticket in zip(actors, tickets, strict=True):
+        actor.components[Ticket] = ticket
+    return actors
 
 
 def spawn(race: str, parent: Entity, pos: Position) -> Entity:
     """Spawn a monster at the given location."""
-    if not monster_db:
-        init()
-    race_info = monster_db[race]
-    world = parent.world
-    ctx = world[None].components[Context]
-    actor = world.new_entity(tags=[IsActor])
-    actor.components.update(
-        {
-            Ticket: ctx.sched.schedule(0, actor),
-            Position: pos,
-            Graphic: Graphic(race_info.ch, race_info.fg),
-            ("name", str): race_info.name,
-            ("hp", int): race_info.hp,
-            ("max_hp", int): race_info.hp,
-            ("attack", int): race_info.attack,
-        }
-    )
-    actor.relation_tags["ChildOf"] = parent
+    (actor,) = spawn_many(race, parent, [pos])
     return actor
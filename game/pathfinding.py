@@ -0,0 +1,68 @@
+"""Shared pathfinding data for actors."""
+
+from __future__ import annotations
+
+import attrs
+import numpy as np
+import tcod.path
+from numpy.typing import NDArray
+from tcod.ecs import Entity
+
+import game.map_tools
+import game.spatial
+from game.components import Direction, Position
+from game.map import Map
+from game.tags import IsActor
+
+NEIGHBORS = tuple(Direction(x, y) for x in (-1, 0, 1) for y in (-1, 0, 1) if x or y)
+"""All adjacent directions."""
+
+
+@attrs.define(eq=False)
+class DistanceField:
+    """The walking distance of every tile on a map to a goal position."""
+
+    goal: Position
+    distance: NDArray[np.int32]
+
+
+def get_distance_field(map: Entity, goal: Position) -> DistanceField:
+    """Return the distance field of `map` towards `goal`.
+
+    The field is cached on the Map and is only recomputed when `goal` or the map tiles change,
+    so every actor hunting the same goal shares one Dijkstra pass.
+    """
+    map_data = map.components[Map]
+
+    def derive() -> DistanceField:
+        cost = np.asarray(game.map_tools.get_tile_data(map, "walk_cost"))
+        distance = tcod.path.maxarray((map_data.height, map_data.width), dtype=np.int32)
+        distance[goal.yx] = 0
+        tcod.path.dijkstra2d(distance, cost, 1, 1, out=distance)
+        return DistanceField(goal, distance)
+
+    return map_data.derive("distance_field", (goal, game.map_tools.tile_data_version(map)), derive)
+
+
+def step_towards(actor: Entity, map: Entity, goal: Position) -> Direction | None:
+    """Return the direction which moves `actor` downhill on the distance field towards `goal`.
+
+    Tiles blocked by other actors are avoided unless they are the goal itself.
+    Returns None if no step gets closer to the goal.
+    """
+    distance = get_distance_field(map, goal).distance
+    height, width = distance.shape
+    pos = actor.components[Position]
+    best_dir: Direction | None = None
+    best_distance = distance[pos.yx]
+    direct = (goal - pos).chebyshev_normalize
+    for direction in sorted(NEIGHBORS, key=lambda d: d.xy != direct.xy):  # Prefer a direct step on ties.
+        dest = pos + direction
+        if not (0 <= dest.x < width and 0 <= dest.y < height):
+            continue
+        if distance[dest.yx] >= best_distance:
+            continue
+        if dest != goal and any(IsActor in other.tags for other in game.spatial.entities_at(map, dest)):
+            continue
+        best_dir, best_distance = direction, distance[dest.yx]
+    return best_dir
@@ -0,0 +1,294 @@
+"""Background generation of maps in worker processes.
+
+When a map is activated the maps its stairways lead to are generated in a process pool.
+Workers generate the map in a scratch world and return it as plain data, which is merged into the real world
+the first time the map is accessed.  The service is opt-in, see `enable`.
+
+The pool is also used to evict the least recently active maps: a stale map is generated again in the background
+and is evicted with `game.map_tools.evict_map` once that is done, so that its changes can be recorded as a delta.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+from collections import OrderedDict, deque
+from collections.abc import Hashable
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any
+
+import attrs
+from tcod.ecs import Entity, World
+
+import game.map_tools
+from game.components import Context, Position
+from game.map import MapKey
+from game.sched import Ticket
+from game.spatial import IndexedAt, SpatialIndex
+from game.tags import ChildOf
+from game.tiles import TileDB
+
+logger = logging.getLogger(__name__)
+
+STAIR_DIRECTIONS = ("up", "down")
+"""Relation tags of stairways which point to other maps."""
+
+
+@attrs.define(frozen=True)
+class LocalRef:
+    """A reference to another entity of the same `GeneratedMap` by its index in `GeneratedMap.entities`."""
+
+    index: int
+
+
+@attrs.define
+class EntityRecipe:
+    """The data of an entity exported from a scratch world."""
+
+    components: dict[Any, Any]
+    """Components other than those managed by the world, such as `Ticket` and `IndexedAt`."""
+    tags: set[Any]
+    """Tags other than the tags mirrored from `Position`."""
+    relations: list[tuple[Any, Hashable | LocalRef]]
+    """Relation tags as `(tag, target)` where target is an entity uid or a `LocalRef`."""
+    delay: int | None
+    """The delay until this entity's next turn, or None if it was not scheduled."""
+
+
+@attrs.define
+class GeneratedMap:
+    """A map and its contents generated in a scratch world."""
+
+    key: MapKey
+    map: EntityRecipe
+    """The map entity itself, whose uid is `key`."""
+    entities: list[EntityRecipe]
+    """The entities which are children of the map, recursively."""
+
+
+def get_descendants(entity: Entity) -> list[Entity]:
+    """Return all entities which are children of `entity` recursively, parents before their children."""
+    descendants: list[Entity] = []
+    queue = deque([entity])
+    while queue:
+        for child in entity.world.Q.all_of(relations=[(ChildOf, queue.popleft())]):
+            descendants.append(child)
+            queue.append(child)
+    return descendants
+
+
+def export_map(map: Entity) -> GeneratedMap:
+    """Export a generated map and all of its descendants from their world."""
+    sched_time = map.world[None].components[Context].sched.time
+    descendants = get_descendants(map)
+    local_refs = {entity: LocalRef(i) for i, entity in enumerate(descendants)}
+
+    def export(entity: Entity) -> EntityRecipe:
+        ticket = entity.components.get(Ticket)
+        return EntityRecipe(
+            components={
+                key: value for key, value in entity.components.items() if key not in (Ticket, IndexedAt, SpatialIndex)
+            },
+            tags={tag for tag in entity.tags if not isinstance(tag, Position)},
+            relations=[
+                (tag, local_refs.get(target, target.uid))
+                for tag, targets in entity.relation_tags_many.items()
+                for target in targets
+            ],
+            delay=ticket.time - sched_time if ticket is not None else None,
+        )
+
+    assert isinstance(map.uid, MapKey)
+    return GeneratedMap(map.uid, export(map), [export(entity) for entity in descendants])
+
+
+def _apply_recipe(entity: Entity, recipe: EntityRecipe, local_entities: list[Entity]) -> None:
+    """Add the data of `recipe` to `entity`, `LocalRef` targets are indexes of `local_entities`."""
+    world = entity.world
+    for tag in recipe.tags:
+        entity.tags.add(tag)
+    for tag, target in recipe.relations:
+        entity.relation_tags_many[tag].add(
+            local_entities[target.index] if isinstance(target, LocalRef) else world[target]
+        )
+    entity.components.update(recipe.components)  # Position is set after ChildOf so that the entity is indexed.
+    if recipe.delay is not None:
+        entity.components[Ticket] = world[None].components[Context].sched.schedule(recipe.delay, entity)
+
+
+def spawn_recipes(world: World, recipes: list[EntityRecipe]) -> list[Entity]:
+    """Create new entities in `world` from `recipes` and return them."""
+    entities = [world.new_entity() for _ in recipes]
+    for entity, recipe in zip(entities, recipes, strict=True):
+        _apply_recipe(entity, recipe, entities)
+    return entities
+
+
+def merge_map(world: World, generated: GeneratedMap) -> Entity:
+    """Create the map and entities of `generated` in `world` and return the map entity."""
+    map = world[generated.key]
+    _apply_recipe(map, generated.map, spawn_recipes(world, generated.entities))
+    return map
+
+
+def generate(key: MapKey, tile_db: TileDB, seed: int) -> GeneratedMap:
+    """Generate the map of `key` for the world `seed` in a new scratch world and export it.
+
+    This is called in worker processes, and by `game.map_tools.get_map` when an evicted map is not pregenerated.
+    """
+    world = World()
+    world[None].components.update({Context: Context(seed=seed), TileDB: tile_db})
+    return export_map(game.map_tools.get_map(world, key))
+
+
+class Pregenerator:
+    """A pool of worker processes generating maps ahead of time, stored as a component of the global entity.
+
+    Pending work is not saved, unfinished maps are generated normally when accessed.
+    """
+
+    def __init__(self, max_workers: int = 1, max_live_maps: int | None = None) -> None:
+        """Initialize the service, worker processes are started when the first map is submitted.
+
+        If `max_live_maps` is given then only that many of the most recently active maps are kept, see `evict_stale`.
+        """
+        assert max_live_maps is None or max_live_maps >= 1
+        self.max_workers = max_workers
+        self.max_live_maps = max_live_maps
+        self.pending: dict[MapKey, Future[GeneratedMap]] = {}
+        """Maps being generated."""
+        self.live: OrderedDict[MapKey, None] = OrderedDict()
+        """Activated maps which have not been evicted, from least to most recently activated."""
+        self._executor: ProcessPoolExecutor | None = None
+        self._workers: set[multiprocessing.process.BaseProcess] = set()
+        """The worker processes started by the pool."""
+
+    def __reduce__(self) -> tuple[type[Pregenerator], tuple[int, int | None]]:
+        """Pickle only the configuration of this service."""
+        return self.__class__, (self.max_workers, self.max_live_maps)
+
+    def submit(self, key: MapKey, tile_db: TileDB, seed: int) -> None:
+        """Start generating the map of `key` for the world `seed` if it is not already pending."""
+        if key in self.pending:
+            return
+        if self._executor is None:
+            # Spawn workers instead of forking, the parent process may have an active window or GPU context.
+            self._executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        children = set(multiprocessing.active_children())
+        self.pending[key] = self._executor.submit(generate, key, tile_db, seed)
+        self._workers |= set(multiprocessing.active_children()) - children  # Workers are started by `submit`.
+
+    def shutdown(self) -> None:
+        """Stop the worker processes and discard any pending maps.
+
+        Workers are terminated instead of waiting for the maps in progress, which could take as long as a map does.
+        """
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for worker in self._workers:
+            if worker.is_alive():
+                worker.terminate()
+        self._workers.clear()
+        self._executor = None
+
+
+def enable(world: World, max_workers: int = 1, max_live_maps: int | None = None) -> None:
+    """Enable background pregeneration for `world`, starting with the neighbors of its active map.
+
+    If `max_live_maps` is given then the least recently active maps over that limit are evicted.
+    """
+    world[None].components[Pregenerator] = Pregenerator(max_workers, max_live_maps)
+    active_map = world[None].components[Context].active_map
+    request_neighbors(active_map)
+    evict_stale(active_map)
+
+
+def shutdown(world: World) -> None:
+    """Stop background pregeneration for `world` if it is enabled, this must be called before discarding `world`."""
+    service = world[None].components.get(Pregenerator)
+    if service is not None:
+        service.shutdown()
+
+
+def request_neighbors(map: Entity) -> None:
+    """Start generating the ungenerated maps which the stairways of `map` lead to, if pregeneration is enabled."""
+    world = map.world
+    service = world[None].components.get(Pregenerator)
+    if service is None:
+        return
+    for stairs in world.Q.all_of(tags=["IsStairway"], relations=[(ChildOf, map)]):
+        for direction in STAIR_DIRECTIONS:
+            target = stairs.relation_tag.get(direction)
+            if target is None or "IsGenerated" in target.tags or not isinstance(target.uid, MapKey):
+                continue
+            service.submit(target.uid, world[None].components[TileDB], world[None].components[Context].seed)
+
+
+def evict_stale(map: Entity) -> None:
+    """Mark `map` as the most recently active map and evict the least recently active maps over the limit.
+
+    Each stale map is submitted to be generated again, and is evicted by a later call once that has finished.
+    Stale maps are kept until then, so that eviction never generates a map in the main process.
+    Does nothing unless pregeneration is enabled with `max_live_maps`.
+    """
+    world = map.world
+    service = world[None].components.get(Pregenerator)
+    if service is None or service.max_live_maps is None:
+        return
+    key = map.uid
+    assert isinstance(key, MapKey)
+    service.live[key] = None
+    service.live.move_to_end(key)
+    stale_base = service.pending.pop(key, None)  # This map is no longer stale, its next eviction is far off.
+    if stale_base is not None:
+        stale_base.cancel()
+    for stale in list(service.live)[: -service.max_live_maps]:
+        base = service.pending.get(stale)
+        if base is None:
+            service.submit(stale, world[None].components[TileDB], world[None].components[Context].seed)
+            continue
+        if not base.done():
+            continue
+        del service.live[stale]
+        generated = take_generated(world, stale)
+        if generated is not None:
+            logger.debug("Evicting %r", stale)
+            game.map_tools.evict_map(world[stale], generated)
+
+
+def take_generated(world: World, key: MapKey) -> GeneratedMap | None:
+    """Return the pregenerated map of `key` without merging it into `world`.
+
+    Returns None if the map was never submitted, is still in progress, or if its generation failed.
+    This never waits for a worker.
+    """
+    service = world[None].components.get(Pregenerator)
+    if service is None:
+        return None
+    future = service.pending.pop(key, None)
+    if future is None:
+        return None
+    if not future.done():
+        future.cancel()  # A map already being generated is finished by its worker and discarded.
+        logger.debug("Pregeneration of %r is still in progress, it will be generated normally.", key)
+        return None
+    try:
+        return future.result()
+    except Exception:
+        logger.exception("Pregeneration of %r failed, it will be generated normally.", key)
+        return None
+
+
+def take(world: World, key: MapKey) -> Entity | None:
+    """Merge the pregenerated map of `key` into `world` and return it.
+
+    Returns None if the map is not ready, the caller should then generate the map itself.  See `take_generated`.
+    """
+    generated = take_generated(world, key)
+    if generated is None:
+        return None
+    return merge_map(world, generated)
@@ -1,15 +1,15 @@
 """Functions for rendering world data to a tcod console."""
 
-import itertools
 from typing import Any
 
 import numpy as np
 import tcod.camera
 import tcod.console
 from numpy.typing import NDArray
-from tcod.ecs import World
+from tcod.ecs import Entity, World
 
 import game.actor_tools
+import game.spatial
 from game.components import Context, Graphic, Position
 from game.map import Map
 from game.map_attrs import a_tiles
@@ -19,6 +19,23 @@
 
 SHROUD = np.array([(0x20, (0, 0, 0), (0, 0, 0))], dtype=tcod.console.rgb_graphic)
 
+OBJ_LAYER_DTYPE = np.dtype([("layer", np.int8), ("i", np.intp), ("j", np.intp), ("ch", np.intc), ("fg", "3B")])
+"""An object graphic at an array index.  Objects on higher layers are drawn over lower layers."""
+
+
+_consoles: dict[str, tcod.console.Console] = {}
+"""Persistent off-screen consoles by name."""
+
+
+def get_console(name: str, width: int, height: int) -> tcod.console.Console:
+    """Return a cleared off-screen console, reusing the previous console of `name` if its size has not changed."""
+    console = _consoles.get(name)
+    if console is None or (console.width, console.height) != (width, height):
+        console = _consoles[name] = tcod.console.Console(width, height)
+    else:
+        console.clear()
+    return console
+
 
 def render_all(world: World, console: tcod.console.Console) -> None:
     """Render the world and UI."""
@@ -28,16 +45,12 @@ def render_all(world: World, console: tcod.console.Console) -> None:
     # if __debug__:
     #    console.rgb[:] = 0x20, (0, 127, 0), (255, 0, 255)
     render_map(world, console.rgb[:-LOG_HEIGHT, :-SIDEBAR_WIDTH])
-    log_console = tcod.console.Console(console.width - SIDEBAR_WIDTH, LOG_HEIGHT)
-    side_console = tcod.console.Console(SIDEBAR_WIDTH, console.height)
-
-    y = log_console.height
-    for message in reversed(world[None].components[MessageLog].log):
-        text = str(message)
-        y -= tcod.console.get_height_rect(log_console.width, text)
-        log_console.print_box(0, y, log_console.width, 0, text, (255, 255, 255))
-        if y <= 0:
-            break
+    log_console = get_console("log", console.width - SIDEBAR_WIDTH, LOG_HEIGHT)
+    side_console = get_console("sidebar", SIDEBAR_WIDTH, console.height)
+
+    lines = world[None].components[MessageLog].last_lines(log_console.width, log_console.height)
+    for y, line in enumerate(lines, start=log_console.height - len(lines)):
+        log_console.print(0, y, line, fg=(255, 255, 255))
     log_console.blit(console, dest_x=0, dest_y=console.height - log_console.height)
 
     side_console.print(0, 0, f"Turn: {world[None].components[Context].sched.time}", fg=(255, 255, 255))
@@ -49,6 +62,29 @@ def render_all(world: World, console: tcod.console.Console) -> None:
     side_console.blit(console, dest_x=console.width - side_console.width, dest_y=0)
 
 
+def gather_objects(map: Entity, world_slice: tuple[slice, ...]) -> NDArray[Any]:
+    """Return the graphics of the objects within `world_slice` of `map` as an `OBJ_LAYER_DTYPE` array.
+
+    Indexes are relative to the slice.  When objects share a tile only the one drawn on top is returned,
+    so the result can be scattered onto a graphics array in a single assignment.
+    """
+    y_start, x_start = world_slice[0].start, world_slice[1].start
+    width, height = world_slice[1].stop - x_start, world_slice[0].stop - y_start
+    gathered = []
+    for obj in game.spatial.entities_in_rect(map, x_start, y_start, width, height):
+        graphic = obj.components.get(Graphic)
+        if graphic is None:
+            continue
+        pos = obj.components[Position]
+        gathered.append((IsActor in obj.tags, pos.y - y_start, pos.x - x_start, graphic.ch, graphic.fg))
+    objs = np.array(gathered, dtype=OBJ_LAYER_DTYPE)
+    objs = objs[np.argsort(objs["layer"], kind="stable")]
+    # Keep only the last object drawn on each tile.
+    _, last_reversed = np.unique((objs["i"] * width + objs["j"])[::-1], return_index=True)
+    result: NDArray[Any] = objs[objs.size - 1 - last_reversed]
+    return result
+
+
 def render_map(world: World, out: NDArray[Any]) -> None:
     """Render the active world map, showing visible and remembered tiles/objects."""
     map = world[None].components[Context].active_map
@@ -65,25 +101,16 @@ def render_map(world: World, out: NDArray[Any]) -> None:
 
     visible_graphics = tiles_db.data["graphic"][world_view]
 
-    for obj in itertools.chain(
-        world.Q.all_of([Position, Graphic], relations=[("ChildOf", map)]).none_of(tags=[IsActor]),
-        world.Q.all_of([Position, Graphic], tags=[IsActor], relations=[("ChildOf", map)]),
-    ):
-        pos = obj.components[Position]
-        screen_x = pos.x - camera_ij[1] - screen_slice[1].start
-        screen_y = pos.y - camera_ij[0] - screen_slice[0].start
-        if 0 <= screen_x < visible_graphics.shape[1] and 0 <= screen_y < visible_graphics.shape[0]:
-            graphic = obj.components[Graphic]
-            visible_graphics[["ch", "fg"]][screen_y, screen_x] = graphic.ch, graphic.fg
+    objs = gather_objects(map, world_slice)
+    visible_graphics["ch"][objs["i"], objs["j"]] = objs["ch"]
+    visible_graphics["fg"][objs["i"], objs["j"]] = objs["fg"]
 
     memory_graphics = tiles_db.data["graphic"][player_memory.tiles[world_slice]]
 
-    for pos, obj in player_memory.objs.items():
-        screen_x = pos.x - camera_ij[1] - screen_slice[1].start
-        screen_y = pos.y - camera_ij[0] - screen_slice[0].start
-        if 0 <= screen_x < visible_graphics.shape[1] and 0 <= screen_y < visible_graphics.shape[0]:
-            graphic = obj.components[Graphic]
-            memory_graphics[["ch", "fg"]][screen_y, screen_x] = graphic.ch, graphic.fg
+    remembered_objs = player_memory.objs[world_slice]
+    has_obj = remembered_objs["ch"] != 0
+    memory_graphics["ch"][has_obj] = remembered_objs["ch"][has_obj]
+    memory_graphics["fg"][has_obj] = remembered_objs["fg"][has_obj]
 
     memory_graphics["fg"] //= 2
     memory_graphics["bg"] //= 2
@@ -0,0 +1,100 @@
+"""Saving and loading entire worlds.
+
+Worlds are pickled with protocol 5 and NumPy arrays are written as out-of-band buffers after the pickle stream,
+so map arrays and memory layers are written directly from their memory instead of being copied into the stream.
+When loading, large buffers are memory-mapped copy-on-write, so only the parts of them which are used get read.
+
+The file layout is a header, a table of `(offset, length)` for each buffer, the pickle stream, then the buffers.
+"""
+
+from __future__ import annotations
+
+import io
+import mmap
+import pickle
+import struct
+from pathlib import Path
+from typing import Any, BinaryIO
+
+import numpy as np
+from tcod.ecs import World
+
+MAGIC = b"ECSWORLD"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sIIQ")
+"""Magic bytes, format version, number of buffers, and length of the pickle stream."""
+_BUFFER_ENTRY = struct.Struct("<QQ")
+"""Offset and length of a buffer."""
+ALIGNMENT = 64
+"""Buffers are aligned to this many bytes in the file, so that arrays loaded from them are aligned."""
+MMAP_THRESHOLD = 64 * 1024
+"""Buffers of at least this many bytes are memory-mapped when loading, smaller buffers are copied into memory."""
+
+
+class _WorldPickler(pickle.Pickler):
+    """Pickler which saves memory-mapped arrays as ordinary arrays, so that they can be saved out-of-band."""
+
+    def reducer_override(self, obj: Any) -> Any:  # noqa: ANN401
+        if isinstance(obj, np.memmap):
+            return np.asarray(obj).__reduce_ex__(5)
+        return NotImplemented
+
+
+def _write(file: BinaryIO, world: World) -> None:
+    """Write `world` to a binary `file`."""
+    buffers: list[pickle.PickleBuffer] = []
+    stream = io.BytesIO()  # Only holds the small objects, arrays go to `buffers`.
+    _WorldPickler(stream, protocol=5, buffer_callback=buffers.append).dump(world)
+    raw_buffers = [buffer.raw() for buffer in buffers]
+
+    position = _HEADER.size + _BUFFER_ENTRY.size * len(raw_buffers) + stream.tell()
+    offsets: list[int] = []
+    for raw in raw_buffers:
+        position += -position % ALIGNMENT
+        offsets.append(position)
+        position += raw.nbytes
+
+    file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(raw_buffers), stream.tell()))
+    for offset, raw in zip(offsets, raw_buffers, strict=True):
+        file.write(_BUFFER_ENTRY.pack(offset, raw.nbytes))
+    file.write(stream.getbuffer())
+    for offset, raw in zip(offsets, raw_buffers, strict=True):
+        file.write(b"\0" * (offset - file.tell()))
+        file.write(raw)
+
+
+def save_world(world: World, path: Path) -> None:
+    """Save `world` to `path`.
+
+    The file is written under a temporary name and then moved over `path`,
+    so that a world loaded from `path` and still mapping it is not affected.
+    """
+    temp_path = path.with_name(f"{path.name}.tmp")
+    with temp_path.open("wb") as file:
+        _write(file, world)
+    temp_path.replace(path)
+
+
+def load_world(path: Path) -> World:
+    """Load and return a world saved with `save_world`.
+
+    Raises ValueError if `path` is not a supported save file.
+    """
+    with path.open("rb") as file:  # The mapping stays valid after the file is closed.
+        magic, version, buffer_count, stream_size = _HEADER.unpack(file.read(_HEADER.size).ljust(_HEADER.size, b"\0"))
+        if magic != MAGIC:
+            msg = f"{path} is not a save file."
+            raise ValueError(msg)
+        if version != FORMAT_VERSION:
+            msg = f"{path} has an unsupported save format version: {version}"
+            raise ValueError(msg)
+        view = memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY))
+
+    buffers: list[Any] = []
+    for i in range(buffer_count):
+        offset, length = _BUFFER_ENTRY.unpack_from(view, _HEADER.size + _BUFFER_ENTRY.size * i)
+        buffer = view[offset : offset + length]
+        buffers.append(buffer if length >= MMAP_THRESHOLD else bytearray(buffer))
+    stream_start = _HEADER.size + _BUFFER_ENTRY.size * buffer_count
+    world: World = pickle.loads(view[stream_start : stream_start + stream_size], buffers=buffers)  # noqa: S301
+    return world
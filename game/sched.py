@@ -15,23 +15,206 @@ class Ticket(NamedTuple, Generic[T]):
 
 
 class TurnQueue(Generic[T]):
-    def __init__(self, *, time: int = 0, next_uid: int = 0, heap: Iterable[Ticket[T]] = ()) -> None:
+    """A priority queue of scheduled values.
+
+    If `indexed` is True then each value can only have one ticket at a time.
+    A position map is kept for every value so that tickets can be cancelled or rescheduled in O(log n) time,
+    this means the heap never holds stale tickets and has no need for lazy deletion.
+    Values must be hashable in this mode.
+
+    >>> sched = TurnQueue[str](indexed=True)
+    >>> sched.schedule(10, "a").time, sched.schedule(20, "b").time
+    (10, 20)
+    >>> sched.reschedule(30, "a").time
+    30
+    >>> sched.cancel("b").value
+    'b'
+    >>> len(sched), sched.pop().value
+    (1, 'a')
+    """
+
+    def __init__(
+        self, *, time: int = 0, next_uid: int = 0, heap: Iterable[Ticket[T]] = (), indexed: bool = False
+    ) -> None:
         self.time = time
         self.next_uid = next_uid
         self.heap = list(heap)
+        self.indexed = indexed
+        self._positions: dict[T, int] = {}
+        """Mapping of values to their index in `heap`.  Only used when `indexed` is True."""
+        if indexed:
+            self.compact()
+        else:
+            heapq.heapify(self.heap)
+
+    def compact(self) -> None:
+        """Drop all but the most recent ticket of each value and rebuild the heap and position map.
+
+        This is only needed when converting a heap which was built without an index.
+        """
+        assert self.indexed
+        latest: dict[T, Ticket[T]] = {}
+        for ticket in self.heap:
+            if ticket.value not in latest or latest[ticket.value].uid < ticket.uid:
+                latest[ticket.value] = ticket
+        self.heap = list(latest.values())
         heapq.heapify(self.heap)
+        self._positions = {ticket.value: i for i, ticket in enumerate(self.heap)}
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def __contains__(self, value: T) -> bool:
+        assert self.indexed
+        return value in self._positions
+
+    def get(self, value: T) -> Ticket[T] | None:
+        """Return the active ticket for `value` or None if it is not scheduled."""
+        assert self.indexed
+        pos = self._positions.get(value)
+        return None if pos is None else self.heap[pos]
 
     def schedule(self, interval: int, value: T) -> Ticket[T]:
+        if self.indexed:
+            return self.reschedule(interval, value)
         ticket = Ticket(self.time + interval, self.next_uid, value, self.time)
         self.next_uid += 1
         heapq.heappush(self.heap, ticket)
         return ticket
 
+    def schedule_many(self, interval: int, values: Iterable[T]) -> list[Ticket[T]]:
+        """Schedule all of `values` to happen after `interval`, in order, and return their new tickets.
+
+        When adding many values compared to the size of the queue, the heap is rebuilt once instead of pushing each ticket.
+        When `indexed` then values which are already scheduled are rescheduled, and `values` must be unique.
+
+        >>> sched = TurnQueue[str](indexed=True)
+        >>> [ticket.uid for ticket in sched.schedule_many(5, ["a", "b", "c"])]
+        [0, 1, 2]
+        >>> sched.schedule(0, "d").uid, sched.pop().value, sched.pop().value
+        (3, 'd', 'a')
+        """
+        tickets = [
+            Ticket(self.time + interval, uid, value, self.time) for uid, value in enumerate(values, self.next_uid)
+        ]
+        self.next_uid += len(tickets)
+        if len(tickets) * 8 < len(self.heap):  # Pushing a few tickets is cheaper than rebuilding a large heap.
+            for ticket in tickets:
+                self._insert(ticket)
+            return tickets
+        if self.indexed:
+            for ticket in tickets:
+                self.cancel(ticket.value)
+        self.heap += tickets
+        heapq.heapify(self.heap)
+        if self.indexed:
+            self._positions = {ticket.value: i for i, ticket in enumerate(self.heap)}
+            assert len(self._positions) == len(self.heap), "Values must be unique."
+        return tickets
+
+    def reschedule(self, interval: int, value: T) -> Ticket[T]:
+        """Schedule `value` to happen after `interval`, replacing its existing ticket if it has one."""
+        assert self.indexed
+        ticket = Ticket(self.time + interval, self.next_uid, value, self.time)
+        self.next_uid += 1
+        self._insert(ticket)
+        return ticket
+
+    def _insert(self, ticket: Ticket[T]) -> None:
+        """Push `ticket` to the heap, replacing the existing ticket of its value when `indexed`."""
+        if not self.indexed:
+            heapq.heappush(self.heap, ticket)
+            return
+        pos = self._positions.get(ticket.value)
+        if pos is None:
+            self.heap.append(ticket)
+            self._sift_up(len(self.heap) - 1)
+        else:
+            self.heap[pos] = ticket
+            self._sift_down(self._sift_up(pos))
+
+    def cancel(self, value: T) -> Ticket[T] | None:
+        """Remove the ticket of `value` from the queue and return it.  Returns None if `value` was not scheduled."""
+        assert self.indexed
+        pos = self._positions.pop(value, None)
+        if pos is None:
+            return None
+        ticket = self.heap[pos]
+        last = self.heap.pop()
+        if pos < len(self.heap):
+            self.heap[pos] = last
+            self._sift_down(self._sift_up(pos))
+        return ticket
+
+    def due(self) -> list[Ticket[T]]:
+        """Return every ticket scheduled at the same time as the next ticket, in order, without removing them.
+
+        Only the part of the heap holding those tickets is visited.
+
+        >>> sched = TurnQueue[str]()
+        >>> for time, value in [(5, "a"), (0, "b"), (5, "c"), (0, "d")]:
+        ...     _ = sched.schedule(time, value)
+        >>> [ticket.value for ticket in sched.due()]
+        ['b', 'd']
+        """
+        if not self.heap:
+            return []
+        heap = self.heap
+        time = heap[0].time
+        due: list[Ticket[T]] = []
+        stack = [0]
+        while stack:
+            pos = stack.pop()
+            if pos < len(heap) and heap[pos].time == time:
+                due.append(heap[pos])
+                stack += (2 * pos + 1, 2 * pos + 2)
+        due.sort()
+        return due
+
     def peek(self) -> Ticket[T]:
         self.time = self.heap[0].time
         return self.heap[0]
 
     def pop(self) -> Ticket[T]:
-        ticket = heapq.heappop(self.heap)
+        if self.indexed:
+            ticket = self.heap[0]
+            self.cancel(ticket.value)
+        else:
+            ticket = heapq.heappop(self.heap)
         self.time = ticket.time
         return ticket
+
+    def _sift_up(self, pos: int) -> int:
+        """Move the ticket at `pos` towards the root until the heap invariant holds, return its new position."""
+        heap = self.heap
+        ticket = heap[pos]
+        while pos > 0:
+            parent = (pos - 1) >> 1
+            if heap[parent] < ticket:
+                break
+            heap[pos] = heap[parent]
+            self._positions[heap[pos].value] = pos
+            pos = parent
+        heap[pos] = ticket
+        self._positions[ticket.value] = pos
+        return pos
+
+    def _sift_down(self, pos: int) -> int:
+        """Move the ticket at `pos` towards the leaves until the heap invariant holds, return its new position."""
+        heap = self.heap
+        end = len(heap)
+        ticket = heap[pos]
+        while True:
+            child = 2 * pos + 1
+            if child >= end:
+                break
+            if child + 1 < end and heap[child + 1] < heap[child]:
+                child += 1
+            if ticket < heap[child]:
+                break
+            heap[pos] = heap[child]
+            self._positions[heap[pos].value] = pos
+            pos = child
+        heap[pos] = ticket
+        self._positions[ticket.value] = pos
+        return pos
@@ -0,0 +1,157 @@
+"""Headless simulation of the world, for benchmarks and automated testing."""
+
+from __future__ import annotations
+
+import random
+import time
+from collections.abc import Iterable, Iterator
+
+import attrs
+import numpy as np
+from tcod.ecs import Entity, World
+
+import game.commands
+import game.map_tools
+import game.mapgen.caves
+import game.world_logic
+import game.world_tools
+from game.action import Action
+from game.actions import Bump, UseStairs
+from game.components import Context, Direction, Position
+from game.map import MapKey
+from game.travel import force_move
+
+
+@attrs.define
+class SimulationStats:
+    """Timing results of a simulation run."""
+
+    turns: int = 0
+    """Number of player turns simulated."""
+    actions: int = 0
+    """Number of actions performed, including the players actions."""
+    turn_times: list[float] = attrs.field(factory=list)
+    """Wall time in seconds of each player turn, including all AI turns which followed it."""
+
+    @property
+    def elapsed(self) -> float:
+        """Total wall time in seconds."""
+        return sum(self.turn_times)
+
+    @property
+    def turns_per_second(self) -> float:
+        return self.turns / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def actions_per_second(self) -> float:
+        return self.actions / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, q: float) -> float:
+        """Return the `q`th percentile of per-turn latency in seconds."""
+        if not self.turn_times:
+            return 0.0
+        return float(np.percentile(self.turn_times, q))
+
+    def as_dict(self) -> dict[str, float]:
+        """Return a summary of these stats suitable for JSON."""
+        return {
+            "turns": self.turns,
+            "actions": self.actions,
+            "elapsed": self.elapsed,
+            "turns_per_second": self.turns_per_second,
+            "actions_per_second": self.actions_per_second,
+            "p50_ms": self.percentile(50) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+        }
+
+    def __str__(self) -> str:
+        """Return a human readable summary."""
+        return (
+            f"{self.turns} turns, {self.actions} actions in {self.elapsed:.3f}s:"
+            f" {self.turns_per_second:.1f} turns/s, {self.actions_per_second:.1f} actions/s,"
+            f" p50 {self.percentile(50) * 1000:.3f}ms, p99 {self.percentile(99) * 1000:.3f}ms"
+        )
+
+
+def command_action(command: game.commands.InGame) -> Action | None:
+    """Return the action performed by an in-game command, or None if the command has no action."""
+    match command.value:
+        case game.commands.MoveDir(x=dx, y=dy):
+            return Bump([Direction(dx, dy)])
+        case ">":
+            return UseStairs(["down"])
+        case "<":
+            return UseStairs(["up"])
+    return None
+
+
+def random_commands(seed: int | None = None) -> Iterator[Action]:
+    """Yield an endless stream of random movement actions."""
+    rng = random.Random(seed)
+    moves = [command for command in game.commands.InGame if isinstance(command.value, game.commands.MoveDir)]
+    while True:
+        action = command_action(rng.choice(moves))
+        assert action is not None
+        yield action
+
+
+def scripted_commands(script: Iterable[str]) -> Iterator[Action]:
+    """Yield actions from a sequence of command names such as ``["MOVE_N", "MOVE_E", "DOWN_STAIRS"]``.
+
+    Commands without an action are skipped.
+    """
+    for name in script:
+        action = command_action(game.commands.InGame[name])
+        if action is not None:
+            yield action
+
+
+def new_cave_world(  # noqa: PLR0913
+    width: int = 50,
+    height: int = 50,
+    monsters: int = 10,
+    *,
+    immortal: bool = True,
+    seed: int = 0,
+    chunked: bool = False,
+) -> World:
+    """Return a new world with the player placed on the upstairs of a generated cave.
+
+    If `immortal` is True then the player is given enough HP to survive any reasonable benchmark.
+    If `chunked` is True then the cave is stored as a `game.chunked_map.ChunkedMap`.
+    The same `seed` always generates the same cave.
+    """
+    world = game.world_tools.new_world(seed)
+    ctx = world[None].components[Context]
+    # `chunked` is only passed when set, so that the keys and layouts of ordinary caves are unchanged.
+    options = {"chunked": True} if chunked else {}
+    cave = game.map_tools.activate_map(
+        world, MapKey(game.mapgen.caves.new_cave, level=1, width=width, height=height, monsters=monsters, **options)
+    )
+    upstairs: Entity
+    (upstairs,) = world.Q.all_of([Position], relations=[("ChildOf", cave), ("up", ...)])
+    force_move(ctx.player, upstairs.components[Position], cave)
+    if immortal:
+        ctx.player.components[("hp", int)] = ctx.player.components[("max_hp", int)] = 1_000_000_000
+    return world
+
+
+def simulate(world: World, commands: Iterable[Action], turns: int) -> SimulationStats:
+    """Simulate up to `turns` player turns using `commands` as the players actions.
+
+    The simulation stops early if `commands` runs out or if the player dies.
+    """
+    player = world[None].components[Context].player
+    stats = SimulationStats()
+    stats.actions += game.world_logic.until_player_turn(world)
+    for _, action in zip(range(turns), commands, strict=False):
+        start_time = time.perf_counter()
+        try:
+            game.world_logic.do_action(player, action)
+            actions = 1 + game.world_logic.until_player_turn(world)
+        except SystemExit:  # Player has died.
+            break
+        stats.turn_times.append(time.perf_counter() - start_time)
+        stats.turns += 1
+        stats.actions += actions
+    return stats
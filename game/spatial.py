@@ -0,0 +1,87 @@
+"""Per-map spatial index of entity positions.
+
+Every entity with both a `Position` and a `ChildOf` parent is indexed on its parent map.
+The index is kept in sync by the `Position` change callback and by `update`,
+which must be called after changing the `ChildOf` relation of a positioned entity (`game.travel.force_move` does this).
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+
+import attrs
+import tcod.ecs.callbacks
+from tcod.ecs import Entity
+
+from game.components import Position
+from game.tags import ChildOf
+
+
+@attrs.define(eq=False)
+class SpatialIndex:
+    """A sparse hash of the entities on a map, stored as a component of the map entity."""
+
+    cells: dict[Position, dict[Entity, None]] = attrs.field(factory=dict)
+    """Entities at each occupied position, in insertion order."""
+
+
+@attrs.define(frozen=True)
+class IndexedAt:
+    """The map and position an entity is currently indexed at."""
+
+    map: Entity
+    pos: Position
+
+
+def update(entity: Entity) -> None:
+    """Sync the index entry of `entity` with its current Position and ChildOf parent."""
+    old = entity.components.get(IndexedAt)
+    pos = entity.components.get(Position)
+    parent = entity.relation_tag.get(ChildOf)
+    new = IndexedAt(parent, pos) if pos is not None and parent is not None else None
+    if old == new:
+        return
+    if old is not None:
+        cells = old.map.components[SpatialIndex].cells
+        del cells[old.pos][entity]
+        if not cells[old.pos]:
+            del cells[old.pos]
+    if new is None:
+        del entity.components[IndexedAt]
+        return
+    if SpatialIndex not in new.map.components:
+        new.map.components[SpatialIndex] = SpatialIndex()
+    new.map.components[SpatialIndex].cells.setdefault(new.pos, {})[entity] = None
+    entity.components[IndexedAt] = new
+
+
+@tcod.ecs.callbacks.register_component_changed(component=Position)
+def on_position_changed(entity: Entity, old: Position | None, new: Position | None) -> None:
+    """Move entities in the spatial index of their map."""
+    update(entity)
+
+
+def entities_at(map: Entity, pos: Position) -> Iterator[Entity]:
+    """Iterate over the entities at `pos` on `map`."""
+    index = map.components.get(SpatialIndex)
+    if index is None:
+        return iter(())
+    return iter(list(index.cells.get(pos, ())))
+
+
+def entities_in_rect(map: Entity, x: int, y: int, width: int, height: int) -> Iterator[Entity]:
+    """Iterate over the entities on `map` within the given rectangle.
+
+    This checks whichever is smaller, the cells of the rectangle or the occupied cells of the map.
+    """
+    index = map.components.get(SpatialIndex)
+    if index is None or width <= 0 or height <= 0:
+        return
+    if width * height < len(index.cells):
+        for pos_y in range(y, y + height):
+            for pos_x in range(x, x + width):
+                yield from list(index.cells.get(Position(pos_x, pos_y), ()))
+        return
+    for pos, entities in list(index.cells.items()):
+        if x <= pos.x < x + width and y <= pos.y < y + height:
+            yield from list(entities)
@@ -11,7 +11,10 @@
 import game.actions
 import game.actor_tools
 import game.commands
+import game.map_store
+import game.pregen
 import game.rendering
+import game.stats
 import game.world_logic
 from game.components import Context, Direction
 from game.state import Reset, State, StateResult
@@ -74,6 +77,12 @@ def get_position(self, event: tcod.event.MouseButtonEvent | tcod.event.MouseMoti
             return cursor_y
         return None
 
+    def select(self, selected: int | None) -> None:
+        """Focus the menu item at index `selected`, marking the UI as changed only if the focus moved."""
+        if selected != self.selected:
+            self.selected = selected
+            g.ui_generation += 1
+
     def on_event(self, event: tcod.event.Event) -> StateResult:
         match event:
             case tcod.event.KeyDown():
@@ -85,7 +94,7 @@ def on_event(self, event: tcod.event.Event) -> StateResult:
             case tcod.event.MouseMotion(motion=motion):
                 if motion.x == 0 and motion.y == 0:
                     return None
-                self.selected = self.get_position(event)
+                self.select(self.get_position(event))
             case tcod.event.MouseButtonUp(button=tcod.event.BUTTON_LEFT):
                 self.selected = self.get_position(event)
                 if self.selected is not None:
@@ -136,6 +145,14 @@ def __init__(self) -> None:
         )
 
     def new_game(self) -> StateResult:
+        import game.world_tools  # noqa: PLC0415  # Map generators are not imported until the first game starts.
+
+        if hasattr(g, "world"):
+            game.world_logic.close_world(g.world)
+        g.world = game.world_tools.new_world()
+        game.pregen.enable(g.world, max_live_maps=8)
+        game.map_store.enable(g.world)
+        game.stats.enable(g.world)
         return Reset(InGame())
 
     def quit(self) -> StateResult:
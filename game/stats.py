@@ -0,0 +1,175 @@
+"""Columnar storage of actor stats for batch processing.
+
+Stats stay ordinary components such as `("hp", int)`, so code working on single actors is unchanged.
+When the store is enabled, every write to a stat component is also written to a NumPy column at the actor's slot.
+Batch systems modify the columns of many actors at once with array operations, then call `StatsStore.commit`
+to write the changed values back to the components.  Components must not be modified between changing the columns
+and committing them, a component write replaces the uncommitted value of that actor's column.
+
+While the store is enabled `game.actions.Melee` deals damage to the columns, which are committed when
+`game.world_logic.until_player_turn` returns.  A batch of attacks on the player writes its hp component once.
+
+The store is opt-in, see `enable`.
+
+>>> world = tcod.ecs.World()
+>>> store = enable(world)
+>>> orcs = [world.new_entity({("hp", int): hp, ("max_hp", int): 10}) for hp in (2, 9)]
+>>> hp, max_hp = store.columns["hp"], store.columns["max_hp"]
+>>> slots = store.slots_of(orcs)
+>>> hp[slots] = np.minimum(hp[slots] + 3, max_hp[slots])  # Regenerate every orc at once.
+>>> store.commit()
+2
+>>> [orc.components[("hp", int)] for orc in orcs]
+[5, 10]
+>>> orcs[0].components[("attack", int)] = 4
+>>> store.melee(orcs[0], orcs[1])  # Returns the damage and the remaining hp.
+(4, 6)
+>>> orcs[1].components[("hp", int)], commit(world), orcs[1].components[("hp", int)]
+(10, 1, 6)
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+import numpy as np
+import tcod.ecs
+import tcod.ecs.callbacks
+from numpy.typing import NDArray
+from tcod.ecs import Entity, World
+
+from game.tags import ChildOf
+
+STAT_COMPONENTS = {
+    "hp": ("hp", int),
+    "max_hp": ("max_hp", int),
+    "attack": ("attack", int),
+}
+"""Stat column names and the components they mirror."""
+
+
+class StatsStore:
+    """The stats of every actor as columns indexed by slot, stored as a component of the global entity.
+
+    Actors are given a slot when a stat is first assigned to them, and lose it when their last stat is removed.
+    Missing stats are zero in the columns.
+    """
+
+    def __init__(self, capacity: int = 64) -> None:
+        self.slots: dict[Entity, int] = {}
+        """The slot of each actor."""
+        self.entities: list[Entity | None] = []
+        """The actor of each slot, None for free slots."""
+        self._free: list[int] = []
+        self.columns: dict[str, NDArray[np.int64]] = {name: np.zeros(capacity, np.int64) for name in STAT_COMPONENTS}
+        """Stat values by slot, the length of these is the capacity and not the number of slots in use.
+
+        Columns are replaced when the store grows, so they should not be held while actors are being created.
+        """
+        self._committed = {name: column.copy() for name, column in self.columns.items()}
+        """The values of the components, used to find which values were changed by batch systems."""
+
+    def slot(self, entity: Entity) -> int:
+        """Return the slot of `entity`, assigning a new slot if it does not have one."""
+        slot = self.slots.get(entity)
+        if slot is not None:
+            return slot
+        if self._free:
+            slot = self._free.pop()
+            self.entities[slot] = entity
+        else:
+            slot = len(self.entities)
+            self.entities.append(entity)
+            if slot >= len(self.columns["hp"]):
+                self._grow(max(1, slot * 2))
+        self.slots[entity] = slot
+        return slot
+
+    def _grow(self, capacity: int) -> None:
+        """Increase the length of every column to `capacity`."""
+        for columns in (self.columns, self._committed):
+            for name, column in columns.items():
+                columns[name] = np.concatenate([column, np.zeros(capacity - len(column), np.int64)])
+
+    def release(self, entity: Entity) -> None:
+        """Free the slot of `entity`."""
+        slot = self.slots.pop(entity)
+        self.entities[slot] = None
+        self._free.append(slot)
+        for columns in (self.columns, self._committed):
+            for column in columns.values():
+                column[slot] = 0
+
+    def mirror(self, name: str, entity: Entity, value: int | None) -> None:
+        """Record that the stat `name` of `entity` was set to `value`, or removed if `value` is None."""
+        if value is None and entity not in self.slots:
+            return
+        slot = self.slot(entity)
+        self.columns[name][slot] = self._committed[name][slot] = 0 if value is None else value
+        if value is None and not any(key in entity.components for key in STAT_COMPONENTS.values()):
+            self.release(entity)
+
+    def slots_of(self, entities: Iterable[Entity]) -> NDArray[np.intp]:
+        """Return the slots of `entities`, which must all have stats."""
+        return np.fromiter((self.slots[entity] for entity in entities), dtype=np.intp)
+
+    def slots_on(self, map: Entity) -> tuple[list[Entity], NDArray[np.intp]]:
+        """Return the actors with stats on `map` and their slots."""
+        actors = list(map.world.Q.all_of(components=[STAT_COMPONENTS["hp"]], relations=[(ChildOf, map)]))
+        return actors, self.slots_of(actors)
+
+    def melee(self, attacker: Entity, target: Entity) -> tuple[int, int]:
+        """Subtract the attack of `attacker` from the hp column of `target` and return the damage and the new hp.
+
+        The hp component of `target` is written by the next `commit`.
+        """
+        damage = int(self.columns["attack"][self.slots[attacker]])
+        hp = self.columns["hp"]
+        target_slot = self.slots[target]
+        hp[target_slot] -= damage
+        return damage, int(hp[target_slot])
+
+    def commit(self) -> int:
+        """Write every changed column value back to its component and return the number of values written."""
+        written = 0
+        for name, column in self.columns.items():
+            committed = self._committed[name]
+            changed = np.flatnonzero(column != committed)
+            key = STAT_COMPONENTS[name]
+            for slot, value in zip(changed.tolist(), column[changed].tolist(), strict=True):
+                entity = self.entities[slot]
+                assert entity is not None
+                entity.components[key] = value  # Also updates `_committed` from the callback.
+            written += len(changed)
+        return written
+
+
+def enable(world: World) -> StatsStore:
+    """Start mirroring the stats of `world` into a new store and return it."""
+    store = world[None].components[StatsStore] = StatsStore()
+    for name, key in STAT_COMPONENTS.items():
+        for entity in world.Q.all_of(components=[key]):
+            store.mirror(name, entity, entity.components[key])
+    return store
+
+
+def commit(world: World) -> int:
+    """Commit the stats store of `world` and return the number of values written, or 0 if it is not enabled."""
+    store = world[None].components.get(StatsStore)
+    if store is None:
+        return 0
+    return store.commit()
+
+
+def _register(name: str) -> None:
+    """Register the callback which mirrors the stat `name` into the store."""
+
+    @tcod.ecs.callbacks.register_component_changed(component=STAT_COMPONENTS[name])
+    def on_stat_changed(entity: Entity, old: int | None, new: int | None) -> None:
+        store = entity.world[None].components.get(StatsStore)
+        if store is not None:
+            store.mirror(name, entity, new)
+
+
+for _name in STAT_COMPONENTS:
+    _register(_name)
@@ -11,3 +11,12 @@
 """This entity is explicitly marked as an actor."""
 IsPlayer = "IsPlayer"
 """This entity is explicitly marked as player controlled."""
+IsDormant = "IsDormant"
+"""This actor has been taken off the turn queue until something wakes it."""
+HasMemory = "HasMemory"
+"""This actor commits what it sees to memory.  Actors without this tag do not track memory."""
+SharesMemory = "SharesMemory"
+"""This actors memory is recorded on a shared entity, such as a faction.
+
+<actor> SharesMemory <faction>
+"""
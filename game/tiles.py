@@ -1,5 +1,7 @@
 """Collect and handle tile types."""
 
+from __future__ import annotations
+
 from collections.abc import Iterable
 from typing import Any
 
@@ -25,7 +27,7 @@ class TileDB:
     The name `""` exists as a null key returning the id of `0`.
     """
 
-    __slots__ = ("data", "_identifiers", "_names", "__weakref__")
+    __slots__ = ("__weakref__", "_identifiers", "_names", "data", "version")
 
     def __init__(self, tiles: Iterable[dict[str, Any]] = ()) -> None:
         """Initialize a tile database."""
@@ -38,6 +40,8 @@ def __init__(self, tiles: Iterable[dict[str, Any]] = ()) -> None:
         """Tile names in order of definition."""
         self._identifiers: dict[str, int] = {"": 0}
         """Mapping of string keys to tile integer ids."""
+        self.version = 0
+        """Modification counter, increased every time a tile is registered or updated."""
         for tile in tiles:
             self.register(**tile)
 
@@ -61,8 +65,9 @@ def register(
             if self.data.size >= tile_id:
                 self.data = np.pad(self.data, (0, self.data.size))
         self.data[tile_id] = (graphic, transparent, walk_cost)
+        self.version += 1
 
-    def __getnewargs__(self) -> tuple[list[dict[str, Any]]]:
+    def __reduce__(self) -> tuple[type[TileDB], tuple[list[dict[str, Any]]]]:
         """Serialize a database as a list of tiles to be passed to the initializer.
 
         This helps with tile changes better than if the Numpy array was serialized directly.
@@ -74,8 +79,9 @@ def __getnewargs__(self) -> tuple[list[dict[str, Any]]]:
             assert self.data.dtype.names
             for attr in self.data.dtype.names:
                 tile[attr] = self.data[i][attr].tolist()
+            tiles.append(tile)
 
-        return (tiles,)
+        return self.__class__, (tiles,)
 
     def __getitem__(self, key: str) -> int:
         """Return the tile ID for the name `key`."""
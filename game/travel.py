@@ -4,6 +4,7 @@
 
 from tcod.ecs import Entity, World
 
+import game.spatial
 from game.components import Graphic, Position
 from game.map import MapKey
 from game.tags import ChildOf
@@ -28,5 +29,6 @@ def force_move(entity: Entity, xy: Position | tuple[int, int], map: Entity | Non
     entity.components[Position] = xy if isinstance(xy, Position) else Position(*xy)
     if map is not None:
         entity.relation_tag[ChildOf] = map
+        game.spatial.update(entity)
     assert ChildOf in entity.relation_tag
     return entity
@@ -4,45 +4,98 @@
 
 from tcod.ecs import Entity, World
 
+import game.batch_ai
+import game.dormancy
+import game.map_tools
+import game.pregen
+import game.stats
 from game.action import Action, Impossible, Success
-from game.components import Context
+from game.actions import AttackPlayer
+from game.components import Context, Position
 from game.messages import MessageLog
 from game.sched import Ticket
+from game.tags import IsActor
 
 logger = logging.getLogger(__name__)
 
 
-def until_player_turn(world: World) -> None:
-    """Run scheduled entities in order until the player is next."""
+def until_player_turn(world: World) -> int:
+    """Run scheduled entities in order until the player is next.  Return the number of actions performed.
+
+    The stats changed by these actions are committed before returning if `game.stats` is enabled.
+    """
     ctx = world[None].components[Context]
+    actions_performed = 0
     while True:
         next_ticket = ctx.sched.peek()
         entity = next_ticket.value
         assert isinstance(entity, Entity)
-        if next_ticket is not entity.components.get(Ticket):  # Ticket is invalid (possibly rescheduled).
-            ctx.sched.pop()
-            continue
+        assert next_ticket is entity.components.get(Ticket), "Tickets must be cancelled or rescheduled, not replaced."
         ai_action = entity.components.get(("ai", Action))
         if ai_action is None:
-            return
-        do_action(entity, entity.components[("ai", Action)])
+            game.stats.commit(world)
+            return actions_performed
+        if game.dormancy.should_sleep(entity):
+            game.dormancy.sleep(entity)
+            continue
+        if type(ai_action) is AttackPlayer:
+            batch = game.batch_ai.due_attackers(world)
+            if len(batch) >= game.batch_ai.MIN_BATCH and game.batch_ai.can_batch(world):
+                actions_performed += run_batch(world, batch)
+                continue
+        do_action(entity, ai_action)
+        actions_performed += 1
+
+
+def run_batch(world: World, actors: list[Entity]) -> int:
+    """Perform the turns of `actors` planned together by `game.batch_ai`.  Return the number of actions performed.
+
+    `actors` must be the next scheduled actors in order.  Actors next to a cell whose occupancy was changed by an
+    earlier actor of the batch are replanned by their own AI.  Stops early if the turn order was changed.
+    """
+    actions_performed = 0
+    changed: set[Position] = set()  # Cells next to any actor which moved during this batch.
+    for actor, planned in zip(actors, game.batch_ai.plan_attacks(world, actors), strict=True):
+        if not game.batch_ai.is_next(world, actor):
+            break
+        if planned is None:
+            game.dormancy.sleep(actor)
+            continue
+        pos = actor.components[Position]
+        do_action(actor, actor.components[("ai", Action)] if pos in changed else planned)
+        actions_performed += 1
+        new_pos = actor.components.get(Position)
+        if new_pos != pos or IsActor not in actor.tags:
+            changed.update(game.batch_ai.neighborhood(pos))
+            if new_pos is not None:
+                changed.update(game.batch_ai.neighborhood(new_pos))
+    return actions_performed
 
 
 def do_action(actor: Entity, action: Action) -> None:
     """Perform the given action on the given actor."""
     ctx = actor.world[None].components[Context]
+    ctx.generation += 1
     is_player = ("ai", Action) not in actor.components
     match action.perform(actor):
         case Success(time_passed=time_passed):
-            assert ctx.sched.peek() is actor.components[Ticket]
-            ctx.sched.pop()
-            actor.components[Ticket] = ctx.sched.schedule(time_passed, actor)
+            current_ticket = ctx.sched.peek()  # Also syncs the queue time to this turn.
+            assert current_ticket is actor.components[Ticket]
+            actor.components[Ticket] = ctx.sched.reschedule(time_passed, actor)
+            if is_player:
+                game.dormancy.wake_near(ctx.active_map, actor.components[Position], game.dormancy.WAKE_RADIUS)
+                game.map_tools.unload_distant_chunks(ctx.active_map)
         case Impossible(reason=reason):
             if is_player:
                 actor.world[None].components[MessageLog].append(reason)
             else:
                 logger.debug("Impossible: %s", reason)
-                ctx.sched.pop()
-                actor.components[Ticket] = ctx.sched.schedule(100, actor)
+                game.dormancy.sleep(actor)  # Woken again when the player acts nearby.
         case _:
             raise NotImplementedError()
+
+
+def close_world(world: World) -> None:
+    """Stop the background services of `world` and write out its pending data, call this before discarding `world`."""
+    game.pregen.shutdown(world)
+    world[None].components[MessageLog].flush()
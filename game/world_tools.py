@@ -1,5 +1,7 @@
 """Tools for working with the world."""
 
+import random
+
 from tcod.ecs import World
 
 import game.tiles
@@ -9,15 +11,15 @@
 from game.mapgen.test import test_map
 from game.messages import MessageLog
 from game.monsters import spawn
-from game.tags import IsPlayer
+from game.tags import HasMemory, IsPlayer
 
 
-def new_world() -> World:
-    """Return a newly generated World."""
+def new_world(seed: int | None = None) -> World:
+    """Return a newly generated World.  A random `seed` is used if one isn't given."""
     world = World()
     world[None].components.update(
         {
-            Context: Context(),
+            Context: Context(seed=random.getrandbits(64) if seed is None else seed),
             MapDict: MapDict(),
             MessageLog: MessageLog(),
         }
@@ -27,4 +29,5 @@ def new_world() -> World:
     activate_map(world, MapKey(test_map))
     ctx.player = spawn("player", ctx.active_map, Position(1, 1))
     ctx.player.tags.add(IsPlayer)
+    ctx.player.tags.add(HasMemory)
     return world
@@ -1,18 +1,26 @@
 #!/usr/bin/env python
 """Main script entry point."""
+
 import logging
+import multiprocessing
+import os
 import sys
+import time
 import warnings
+from collections.abc import Hashable
+from pathlib import Path
 
+import tcod.console
 import tcod.context
+import tcod.event
 import tcod.tileset
 
 import g
-import game.monsters
+import game.content_cache
 import game.state
 import game.states
 import game.world_logic
-import game.world_tools
+from game.components import Context
 
 
 def handle_state(result: game.state.StateResult) -> None:
@@ -32,9 +40,16 @@ def handle_state(result: game.state.StateResult) -> None:
         game.world_logic.until_player_turn(g.world)
 
 
-def main() -> None:
-    """Program entry point."""
-    tileset = tcod.tileset.load_tilesheet("data/dejavu16x16_gs_tc.png", 32, 8, tcod.tileset.CHARMAP_TCOD)
+def main(*, headless: bool = False) -> None:
+    """Program entry point.
+
+    If `headless` is True then no window is shown and the program exits after presenting the first frame,
+    printing the time it was presented.  This is used to benchmark startup time.
+    """
+    if headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ.setdefault("SDL_RENDER_DRIVER", "software")
+    tileset = game.content_cache.load_tilesheet(Path("data/dejavu16x16_gs_tc.png"), 32, 8, tcod.tileset.CHARMAP_TCOD)
 
     with tcod.context.new(
         tileset=tileset,
@@ -43,20 +58,41 @@ def main() -> None:
         title=None,
         vsync=True,
     ) as g.context:
-        g.world = game.world_tools.new_world()
         g.state = [game.states.MainMenu()]
-        while True:
-            console = g.context.new_console(30, 20)
-            g.state[-1].on_draw(console)
-            g.context.present(console, keep_aspect=True, integer_scaling=True)
-            for event_pixels in tcod.event.wait():
-                event_tiles = g.context.convert_event(event_pixels)
-                handle_state(g.state[-1].on_event(event_tiles))
+        try:
+            console: tcod.console.Console | None = None
+            last_frame: Hashable = None
+            while True:
+                if console is None or (console.width, console.height) != g.context.recommended_console_size(30, 20):
+                    console = g.context.new_console(30, 20)
+                world_generation = (
+                    (id(g.world), g.world[None].components[Context].generation) if hasattr(g, "world") else None
+                )
+                frame = (g.ui_generation, world_generation, console.width, console.height)
+                # Only redraw when something has changed, otherwise keep the last presented frame.
+                if frame != last_frame:
+                    console.clear()
+                    g.state[-1].on_draw(console)
+                    g.context.present(console, keep_aspect=True, integer_scaling=True)
+                    last_frame = frame
+                    if headless:
+                        print(f"presented {time.time()!r}")
+                        return
+                for event_pixels in tcod.event.wait():
+                    # States must mark motion changes themselves.
+                    if not isinstance(event_pixels, tcod.event.MouseMotion):
+                        g.ui_generation += 1
+                    event_tiles = g.context.convert_event(event_pixels)
+                    handle_state(g.state[-1].on_event(event_tiles))
+        finally:
+            if hasattr(g, "world"):
+                game.world_logic.close_world(g.world)
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Pregeneration workers must not run the game in frozen builds.
     if __debug__:
         logging.basicConfig(level=logging.DEBUG)
         if not sys.warnoptions:
             warnings.simplefilter("default")
-    main()
+    main(headless="--headless" in sys.argv[1:])